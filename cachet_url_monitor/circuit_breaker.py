@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+Circuit breaker used to stop calling a service that keeps failing, so its outage doesn't slow the monitor down.
+"""
+import threading
+import time
+
+CIRCUIT_CLOSED = 'closed'
+CIRCUIT_OPEN = 'open'
+CIRCUIT_HALF_OPEN = 'half-open'
+
+
+class CircuitBreaker(object):
+    """Opens after `failure_threshold` consecutive failures. While open, calls are rejected until `reset_timeout`
+    seconds have passed, then a single trial call is allowed: it closes the circuit if it succeeds and opens it
+    again otherwise.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout, clock=time.time):
+        self.failure_threshold = max(int(failure_threshold), 1)
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CIRCUIT_CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Returns True if the call can go through."""
+        with self.lock:
+            if self.state == CIRCUIT_CLOSED:
+                return True
+            if self.state == CIRCUIT_OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                # Only the trial call goes through, the others are rejected until we know its result.
+                self.state = CIRCUIT_HALF_OPEN
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.state = CIRCUIT_CLOSED
+            self.failures = 0
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == CIRCUIT_HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = CIRCUIT_OPEN
+                self.opened_at = self.clock()
+
+    @property
+    def is_open(self):
+        return self.state != CIRCUIT_CLOSED
@@ -1,18 +1,46 @@
 #!/usr/bin/env python
 import abc
 import copy
+import functools
 import logging
+import multiprocessing
+import operator
 import os
 import re
+import threading
 import time
+from multiprocessing.pool import ThreadPool
 
 import requests
 from yaml import dump
 from yaml import load
 import json
 
+try:
+    import numpy
+except ImportError:
+    # Without numpy, the sweeps are evaluated with plain lists.
+    numpy = None
+
 import latency_unit
 import status as st
+from circuit_breaker import CircuitBreaker
+from discovery import DiscoveryCache
+from history import DEFAULT_WINDOWS
+from history import FleetHistory
+from history import StatusHistory
+from incident import INCIDENT_GROUPINGS
+from incident import IncidentCorrelator
+from probe import PHASES
+from probe import Prober
+from rate_limiter import PRIORITY_HIGH
+from rate_limiter import PRIORITY_LOW
+from rate_limiter import PRIORITY_NORMAL
+from rate_limiter import RateLimiters
+from rate_limiter import parse_retry_after
+from recorder import Recorder
+from response_cache import ResponseCache
+from status_api import StatusSnapshot
 
 # This is the mandatory fields that must be in the configuration file in this
 # same exact structure.
@@ -49,6 +77,16 @@ class ComponentNonexistentError(Exception):
         return repr('Component with id [%d] does not exist.' % (self.component_id,))
 
 
+class CachetUnavailableError(Exception):
+    """Exception raised when a request to cachet that can't be skipped couldn't be sent."""
+
+    def __init__(self, url):
+        self.url = url
+
+    def __str__(self):
+        return repr('Cachet is unavailable: %s' % (self.url,))
+
+
 class MetricNonexistentError(Exception):
     """Exception raised when the component does not exist."""
 
@@ -59,18 +97,15 @@ class MetricNonexistentError(Exception):
         return repr('Metric with id [%d] does not exist.' % (self.metric_id,))
 
 
-def get_current_status(endpoint_url, component_id, headers):
-    """Retrieves the current status of the component that is being monitored. It will fail if the component does
-    not exist or doesn't respond with the expected data.
-    :return component status.
-    """
-    get_status_request = requests.get('%s/components/%s' % (endpoint_url, component_id), headers=headers)
+def synchronized(method):
+    """Runs the method holding the configuration lock, so the monitored components can't be replaced meanwhile."""
 
-    if get_status_request.ok:
-        # The component exists.
-        return get_status_request.json()['data']['status']
-    else:
-        raise ComponentNonexistentError(component_id)
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
 
 
 def normalize_url(url):
@@ -85,61 +120,299 @@ class Configuration(object):
     of assessing the API and pushing the results to cachet.
     """
 
-    def __init__(self, config_file):
+    def __init__(self, config_file, prober=None, discovery_cache=None, rate_limiters=None):
         self.logger = logging.getLogger('cachet_url_monitor.configuration.Configuration')
         self.config_file = config_file
         self.data = load(file(self.config_file, 'r'))
 
         # Exposing the configuration to confirm it's parsed as expected.
-        self.print_out()
+        if self.logger.isEnabledFor(logging.INFO):
+            self.print_out()
 
         # We need to validate the configuration is correct and then validate the component actually exists.
         self.validate()
 
         # We store the main information from the configuration file, so we don't keep reading from the data dictionary.
-        self.headers = {'X-Cachet-Token': os.environ.get('CACHET_TOKEN') or self.data['cachet']['token']}
-
-        self.endpoint_method = os.environ.get('ENDPOINT_METHOD') or self.data['endpoint']['method']
-
-        self.endpoint_timeout = os.environ.get('ENDPOINT_TIMEOUT') or self.data['endpoint'].get('timeout') or 1
-        self.allowed_fails = os.environ.get('ALLOWED_FAILS') or self.data['endpoint'].get('allowed_fails') or 0
-
-        self.api_url = os.environ.get('CACHET_API_URL') or self.data['cachet']['api_url']
-
-        # get the urls we will monitor
-        self.get_monitoring_urls()
-
-        # ignore metric for now
-        self.metric_id = os.environ.get('CACHET_METRIC_ID') or self.data['cachet'].get('metric_id')
-
-        if self.metric_id is not None:
-            self.default_metric_value = self.get_default_metric_value(self.metric_id)
-
-        # The latency_unit configuration is not mandatory and we fallback to seconds, by default.
-        self.latency_unit = os.environ.get('LATENCY_UNIT') or self.data['cachet'].get('latency_unit') or 's'
-
-        # Get remaining settings
-        self.public_incidents = int(
-            os.environ.get('CACHET_PUBLIC_INCIDENTS') or self.data['cachet']['public_incidents'])
+        for name, value in self.read_settings(self.data).items():
+            setattr(self, name, value)
+
+        # Once cachet fails too many times in a row, we stop calling it until the retry interval has passed.
+        self.cachet_breaker = CircuitBreaker(self.cachet_failure_threshold, self.cachet_retry_interval)
+        # Every call to cachet goes through the rate limiter, the incidents first. It's shared with the other
+        # configurations of the process reporting to the same cachet.
+        self.rate_limiters = rate_limiters or RateLimiters()
+        self.cachet_limiter = self.rate_limiters.get(self.api_url, self.cachet_rate_limit, self.cachet_burst,
+                                                     self.cachet_queue_size)
+        # Components whose status couldn't be pushed while cachet was unavailable.
+        self.pending_updates = set()
+        # How many URLs are checked at the same time, they are checked one by one by default.
+        self.concurrency = int(os.environ.get('ENDPOINT_CONCURRENCY') or self.data['endpoint'].get('concurrency') or 1)
+        self.pool = None
+        # The components whose check is still running on the pool, maybe from a previous sweep.
+        self.probing = set()
+        self.probing_lock = threading.Lock()
+        # When several configurations run in the same process, they share their connections and discovery requests.
+        self.prober = prober or Prober(self.concurrency)
+        self.discovery_cache = discovery_cache or DiscoveryCache()
+        self.response_cache = ResponseCache()
+        self._default_metric_value = None
+        self.correlator = IncidentCorrelator(self.incident_grouping, self.incident_window)
 
         self.expectations = [Expectaction.create(expectation) for expectation in self.data['endpoint']['expectation']]
         for expectation in self.expectations:
             self.logger.info('Registered expectation: %s' % (expectation,))
-        
-        # initialize other variables
-        self.current_timestamps = [-1 for i in range(self.num_urls)]
-        self.messages = ["" for i in range(self.num_urls)]
-        # We need the current status so we monitor the status changes. This is necessary for creating incidents.
-        self.statuses = [get_current_status(self.api_url, self.component_ids[i], self.headers) for i in range(self.num_urls)]
-        self.requests = [-1 for i in range(self.num_urls)]
-        self.trigger_updates = [True for i in range(self.num_urls)] 
-        self.current_fails = [0 for i in range(self.num_urls)]
-        self.incident_ids = [-1 for i in range(self.num_urls)]
-        self.versions = ["" for i in range(self.num_urls)]
+
+        # The last statuses of each component, kept in memory to compute their uptime and availability.
+        history = self.data.get('history') or {}
+        self.fleet_history = FleetHistory(history.get('windows') or DEFAULT_WINDOWS)
+        self.history_capacity = int(history.get('capacity') or
+                                    max(self.fleet_history.windows) // self.data['frequency'] + 1)
+        self.histories = {}
+        # Every sweep can be recorded, to be replayed later without the endpoints.
+        record_file = os.environ.get('RECORD_FILE') or self.data.get('record_file')
+        self.recorder = Recorder(record_file) if record_file else None
+        # The status of the components can be served by a local API, which reads the snapshot taken after each
+        # check.
+        status_api = self.data.get('status_api') or {}
+        self.status_api_host = os.environ.get('STATUS_API_HOST') or status_api.get('host') or '127.0.0.1'
+        self.status_api_port = int(os.environ.get('STATUS_API_PORT') or status_api.get('port') or 0)
+        self.snapshot = StatusSnapshot([])
+
+        # The monitored components can be replaced by a background discovery while we are checking them.
+        self.lock = threading.RLock()
+        self.component_ids = []
+        self.incident_ids = []
+        # The last known components and statuses are saved to the state file, if there's one. When it exists at
+        # startup, we start checking right away and the discovery runs in the background.
+        self.state_file = os.environ.get('STATE_FILE') or self.data.get('state_file')
+        state = self.load_state()
+        self.fast_start = state is not None
+        if self.fast_start:
+            self.set_components(state['components'], state['statuses'], state['incident_ids'])
+            bootstrap = threading.Thread(target=self.bootstrap, name='bootstrap')
+            bootstrap.daemon = True
+            bootstrap.start()
+        else:
+            # get the urls we will monitor
+            self.update_urls()
+
+    def read_settings(self, data):
+        """Reads the settings that can be changed while the agent is running from the configuration data.
+        :return: a dictionary with the value of each setting.
+        """
+        settings = {
+            'headers': {'X-Cachet-Token': os.environ.get('CACHET_TOKEN') or data['cachet']['token']},
+            'endpoint_method': os.environ.get('ENDPOINT_METHOD') or data['endpoint']['method'],
+            'endpoint_timeout': os.environ.get('ENDPOINT_TIMEOUT') or data['endpoint'].get('timeout') or 1,
+            'allowed_fails': os.environ.get('ALLOWED_FAILS') or data['endpoint'].get('allowed_fails') or 0,
+            # The results of the expectations looking into the body are reused while the body doesn't change.
+            'body_cache': bool(data['endpoint'].get('body_cache')),
+            'conditional_requests': bool(data['endpoint'].get('conditional_requests')),
+            # Endpoints failing past allowed_fails are only probed once every probe interval.
+            'probe_interval': float(
+                os.environ.get('ENDPOINT_PROBE_INTERVAL') or data['endpoint'].get('probe_interval') or 60),
+            'api_url': os.environ.get('CACHET_API_URL') or data['cachet']['api_url'],
+            'cachet_timeout': float(os.environ.get('CACHET_TIMEOUT') or data['cachet'].get('timeout') or 5),
+            'cachet_failure_threshold': int(
+                os.environ.get('CACHET_FAILURE_THRESHOLD') or data['cachet'].get('failure_threshold') or 3),
+            'cachet_retry_interval': float(
+                os.environ.get('CACHET_RETRY_INTERVAL') or data['cachet'].get('retry_interval') or 30),
+            # ignore metric for now
+            'metric_id': os.environ.get('CACHET_METRIC_ID') or data['cachet'].get('metric_id'),
+            # The latency_unit configuration is not mandatory and we fallback to seconds, by default.
+            'latency_unit': os.environ.get('LATENCY_UNIT') or data['cachet'].get('latency_unit') or 's',
+            # Get remaining settings
+            'public_incidents': int(os.environ.get('CACHET_PUBLIC_INCIDENTS') or data['cachet']['public_incidents']),
+            # Simultaneous failures sharing a center, host or service are reported as a single incident.
+            'incident_grouping': os.environ.get('CACHET_INCIDENT_GROUPING') or data['cachet'].get('incident_grouping'),
+            'incident_window': int(
+                os.environ.get('CACHET_INCIDENT_WINDOW') or data['cachet'].get('incident_window') or 0),
+            # How many component updates we send to cachet at the same time.
+            'cachet_workers': int(os.environ.get('CACHET_WORKERS') or data['cachet'].get('workers') or 8),
+            # How many calls per second we send to cachet, they are not limited by default.
+            'cachet_rate_limit': float(os.environ.get('CACHET_RATE_LIMIT') or data['cachet'].get('rate_limit') or 0),
+            'cachet_burst': int(os.environ.get('CACHET_BURST') or data['cachet'].get('burst') or 1),
+            'cachet_queue_size': int(os.environ.get('CACHET_QUEUE_SIZE') or data['cachet'].get('queue_size') or 100),
+            'cachet_max_wait': float(os.environ.get('CACHET_MAX_WAIT') or data['cachet'].get('max_wait') or 10),
+            # The next runs of the agent's jobs are profiled when profiling gets enabled.
+            'profiling': bool((data.get('profiling') or {}).get('enabled')),
+            'profile_runs': int((data.get('profiling') or {}).get('runs') or 1),
+            'profile_directory': (data.get('profiling') or {}).get('directory'),
+        }
+        if settings['incident_grouping'] is not None and settings['incident_grouping'] not in INCIDENT_GROUPINGS:
+            raise ConfigurationValidationError('Invalid incident grouping: %s' % (settings['incident_grouping'],))
+        return settings
+
+    def reload(self):
+        """Reads the configuration file again and applies the changes at once, without interrupting the checks.
+        Only the expectations that changed are created again, the status of the components and their open
+        incidents are kept. If the new configuration is invalid, an exception is raised and nothing changes.
+        """
+        data = load(file(self.config_file, 'r'))
+        self.validate(data)
+        settings = self.read_settings(data)
+
+        # We reuse the expectations that didn't change.
+        old_expectations = zip(self.data['endpoint']['expectation'], self.expectations)
+        expectations = []
+        for expectation_config in data['endpoint']['expectation']:
+            for index, (old_config, old_expectation) in enumerate(old_expectations):
+                if old_config == expectation_config:
+                    expectations.append(old_expectation)
+                    del old_expectations[index]
+                    break
+            else:
+                expectation = Expectaction.create(expectation_config)
+                self.logger.info('Registered expectation: %s' % (expectation,))
+                expectations.append(expectation)
+
+        if data['endpoint'].get('concurrency') != self.data['endpoint'].get('concurrency'):
+            self.logger.warning('Changing endpoint.concurrency requires a restart')
+        if data.get('state_file') != self.data.get('state_file'):
+            self.logger.warning('Changing state_file requires a restart')
+        if data.get('history') != self.data.get('history'):
+            self.logger.warning('Changing history requires a restart')
+        elif data['frequency'] != self.data['frequency'] and not (data.get('history') or {}).get('capacity'):
+            # The capacity of the history is derived from the frequency.
+            self.logger.warning('Changing frequency requires a restart to resize the history')
+        if data.get('record_file') != self.data.get('record_file'):
+            self.logger.warning('Changing record_file requires a restart')
+        if data.get('status_api') != self.data.get('status_api'):
+            self.logger.warning('Changing status_api requires a restart')
+
+        with self.lock:
+            if settings['metric_id'] != self.metric_id:
+                self._default_metric_value = None
+            for name, value in settings.items():
+                setattr(self, name, value)
+            self.data = data
+            self.expectations = expectations
+            self.cachet_breaker.failure_threshold = self.cachet_failure_threshold
+            self.cachet_breaker.reset_timeout = self.cachet_retry_interval
+            self.cachet_limiter = self.rate_limiters.get(self.api_url, self.cachet_rate_limit, self.cachet_burst,
+                                                         self.cachet_queue_size)
+            self.cachet_limiter.rate = self.cachet_rate_limit
+            self.cachet_limiter.burst = self.cachet_burst
+            self.cachet_limiter.queue_size = self.cachet_queue_size
+            for breaker in self.endpoint_breakers:
+                breaker.failure_threshold = int(self.allowed_fails) + 1
+                breaker.reset_timeout = self.probe_interval
+            self.correlator.grouping = self.incident_grouping
+            self.correlator.window = self.incident_window
+
+        if self.logger.isEnabledFor(logging.INFO):
+            self.print_out()
+
+    def set_components(self, components, statuses, incident_ids=None):
+        """Replaces the monitored components and initializes the variables related to the status of each one of
+        them. The open incidents of components that were already monitored are kept, while the ones of the
+        components that aren't monitored anymore are closed.
+        """
+        closed_incidents = []
+        with self.lock:
+            open_incidents = dict(zip(self.component_ids, self.incident_ids))
+            if incident_ids is not None:
+                restored_incidents = dict((component_id, incident_id) for component_id, incident_id
+                                          in zip(components['component_ids'], incident_ids) if incident_id != -1)
+                # The components sharing an incident are only known from the state file after a restart.
+                self.correlator.restore(restored_incidents)
+                open_incidents.update(restored_incidents)
+            for component_id, incident_id in open_incidents.items():
+                if incident_id != -1 and component_id not in components['component_ids']:
+                    # We are not monitoring this component anymore.
+                    if self.correlator.resolve(incident_id, component_id):
+                        closed_incidents.append(incident_id)
+            for component_id in set(self.histories) - set(components['component_ids']):
+                self.histories.pop(component_id).remove()
+            for component_id in components['component_ids']:
+                if component_id not in self.histories:
+                    self.histories[component_id] = StatusHistory(self.history_capacity, self.fleet_history)
+
+            self.component_ids = components['component_ids']
+            self.component_names = components['component_names']
+            self.endpoint_urls = components['endpoint_urls']
+            self.endpoint_version_urls = components['endpoint_version_urls']
+            self.num_urls = len(self.component_ids)
+
+            self.current_timestamps = [-1 for i in range(self.num_urls)]
+            self.messages = ["" for i in range(self.num_urls)]
+            self.statuses = statuses
+            self.requests = [-1 for i in range(self.num_urls)]
+            self.trigger_updates = [True for i in range(self.num_urls)] 
+            self.current_fails = [0 for i in range(self.num_urls)]
+            self.incident_ids = [open_incidents.get(component_id, -1) for component_id in self.component_ids]
+            self.versions = ["" for i in range(self.num_urls)]
+            self.endpoint_breakers = [CircuitBreaker(int(self.allowed_fails) + 1, self.probe_interval)
+                                      for i in range(self.num_urls)]
+            if self.recorder is not None:
+                self.recorder.record_components(components, statuses)
+            self.take_snapshot()
+        for incident_id in closed_incidents:
+            self.close_incident(incident_id)
+
+    def take_snapshot(self):
+        """Replaces the snapshot read by the status API with the current status of the components."""
+        self.snapshot = StatusSnapshot(
+            StatusSnapshot.component(self.component_ids[i], self.component_names[i], self.statuses[i],
+                                     self.versions[i], self.messages[i], self.current_timestamps[i])
+            for i in range(self.num_urls))
+
+    def bootstrap(self):
+        """Runs the discovery in the background, after a fast start from the state file."""
+        try:
+            self.update_urls()
+        except Exception:
+            self.logger.exception('Failed to update the monitoring urls, keeping the last known ones')
+
+    def load_state(self):
+        """Reads the last known state from the state file.
+        :return: the state or None if there's no state file to start from.
+        """
+        if not self.state_file or not os.path.exists(self.state_file):
+            return None
+        try:
+            with open(self.state_file) as state_file:
+                return json.load(state_file)
+        except (IOError, ValueError):
+            self.logger.exception('Failed to read the state file %s' % (self.state_file,))
+            return None
+
+    @synchronized
+    def save_state(self):
+        """Saves the monitored components, their statuses and open incidents to the state file, if there's one."""
+        if not self.state_file:
+            return
+        state = {
+            'components': {
+                'component_ids': self.component_ids,
+                'component_names': self.component_names,
+                'endpoint_urls': self.endpoint_urls,
+                'endpoint_version_urls': self.endpoint_version_urls,
+            },
+            'statuses': self.statuses,
+            'incident_ids': self.incident_ids,
+        }
+        # We write to a temporary file first, so a crash can't leave a truncated state file behind.
+        temporary_file = '%s.tmp' % (self.state_file,)
+        try:
+            with open(temporary_file, 'w') as state_file:
+                json.dump(state, state_file)
+            os.rename(temporary_file, self.state_file)
+        except (IOError, OSError):
+            self.logger.exception('Failed to write the state file %s' % (self.state_file,))
+
+    @property
+    def default_metric_value(self):
+        """The default value of the configured metric, only fetched once it's needed."""
+        if self._default_metric_value is None:
+            self._default_metric_value = self.get_default_metric_value(self.metric_id)
+        return self._default_metric_value
 
     def get_default_metric_value(self, metric_id):
         """Returns default value for configured metric."""
-        get_metric_request = requests.get('%s/metrics/%s' % (self.api_url, metric_id), headers=self.headers)
+        get_metric_request = self.call_cachet('get', '/metrics/%s' % (metric_id,))
+        if get_metric_request is None:
+            raise CachetUnavailableError('%s/metrics/%s' % (self.api_url, metric_id))
 
         if get_metric_request.ok:
             return get_metric_request.json()['data']['default_value']
@@ -149,37 +422,38 @@ class Configuration(object):
     def get_monitoring_urls(self):
         """Obtains the Cachet components and match them to the corresponding urls.
         We only check the urls and update the components found.
+        :return: the ids, names, urls and version urls of the components that will be monitored.
         """
         self.logger.info('Updating components and monitoring urls...')
         # build Intuit URLs database
         # obtain urls from the yaml files on github
         self.intuit_db = {}
         headers = {'authorization': 'Intuit_IAM_Authentication intuit_appid=Intuit.platform.pcgops-web.pcgopsweb, intuit_app_secret=prdnOkZSA08TRkxqA8uADHs50jtMvqwaEiH3RXSI'}
-        for center in CENTERS:
-            for url in INTUIT_URLS: 
-                url_center = url + center + ".yaml"
-                response = requests.request("GET", url_center, headers=headers)
-                data = load(response.text)
-                if not center in self.intuit_db:
-                    self.intuit_db[center] = {} 
-                for each_entry in data:
-                    name = each_entry['name']
-                    check_url = each_entry['url']
-                    env = each_entry['env']
-                    # ignore overlay services
-                    if not 'overlay' in name: 
-                        # special case when env is prd because we may have multiple prd environments       
-                        if env == 'prd':
-                            name, env_num = name.split('_')
-                            env = env + env_num[-1]
-                        if not name in self.intuit_db[center]:
-                            self.intuit_db[center][name] = {}
-                        self.intuit_db[center][name][env] = {}
-                        self.intuit_db[center][name][env]['url'] = check_url
-                        if 'version_url' in each_entry:
-                            self.intuit_db[center][name][env]['version_url'] = each_entry['version_url']
-                        else:
-                            self.intuit_db[center][name][env]['version_url'] = ''
+        walker_urls = [(center, url + center + ".yaml") for center in CENTERS for url in INTUIT_URLS]
+        walker_files = self.map(lambda walker_url: self.discovery_cache.get(
+            walker_url[1], lambda url: requests.request("GET", url, headers=headers).text), walker_urls)
+        for (center, url_center), walker_file in zip(walker_urls, walker_files):
+            data = load(walker_file)
+            if not center in self.intuit_db:
+                self.intuit_db[center] = {} 
+            for each_entry in data:
+                name = each_entry['name']
+                check_url = each_entry['url']
+                env = each_entry['env']
+                # ignore overlay services
+                if not 'overlay' in name: 
+                    # special case when env is prd because we may have multiple prd environments       
+                    if env == 'prd':
+                        name, env_num = name.split('_')
+                        env = env + env_num[-1]
+                    if not name in self.intuit_db[center]:
+                        self.intuit_db[center][name] = {}
+                    self.intuit_db[center][name][env] = {}
+                    self.intuit_db[center][name][env]['url'] = check_url
+                    if 'version_url' in each_entry:
+                        self.intuit_db[center][name][env]['version_url'] = each_entry['version_url']
+                    else:
+                        self.intuit_db[center][name][env]['version_url'] = ''
         
         # build Cachet Component database
         # read the components from Cachet API
@@ -189,8 +463,7 @@ class Configuration(object):
         # need to fetch page by page, one page only lists 20 components
         url = self.api_url + '/components'
         while url:
-            response = requests.request("GET", url)
-            data = json.loads(response.text)
+            data = json.loads(self.discovery_cache.get(url, self.get_cachet_page))
             for each_entry in data['data']:
                 name = each_entry['name']
                 svc_name, data_center, env = name.split('-')
@@ -202,44 +475,57 @@ class Configuration(object):
         # match the URLs
         # only component with URL matched will be monitored for this period
         # URL matching will be updated periodically (like every 6 hours)
-        self.component_ids = []
-        self.component_names = []
-        self.endpoint_urls = []
-        self.endpoint_version_urls = []
+        components = {'component_ids': [], 'component_names': [], 'endpoint_urls': [], 'endpoint_version_urls': []}
         for center in CENTERS:
             for svc in self.cachet_db[center]:
                 for env in self.cachet_db[center][svc]:
                     if svc in self.intuit_db[center]:
                         if env in self.intuit_db[center][svc]:
-                            self.component_ids.append(self.cachet_db[center][svc][env])
-                            self.component_names.append('-'.join([svc, center, env]))
-                            self.endpoint_urls.append(normalize_url(self.intuit_db[center][svc][env]['url']))
+                            components['component_ids'].append(self.cachet_db[center][svc][env])
+                            components['component_names'].append('-'.join([svc, center, env]))
+                            components['endpoint_urls'].append(normalize_url(self.intuit_db[center][svc][env]['url']))
                             version_url = self.intuit_db[center][svc][env]['version_url']
                             if version_url: 
-                                self.endpoint_version_urls.append(normalize_url(version_url))
+                                components['endpoint_version_urls'].append(normalize_url(version_url))
                             else:
-                                self.endpoint_version_urls.append(version_url)
+                                components['endpoint_version_urls'].append(version_url)
         
-        self.num_urls = len(self.component_ids)
-        print 'Number of URLs:', self.num_urls
-        for endpoint_url in self.endpoint_urls:
+        print 'Number of URLs:', len(components['component_ids'])
+        for endpoint_url in components['endpoint_urls']:
             self.logger.info('Monitoring URL: %s %s' % (self.endpoint_method, endpoint_url))
+        return components
         
         
+    def get_cachet_page(self, url):
+        """Returns the body of a page of cachet's components."""
+        response = self.request_cachet('get', url, priority=PRIORITY_NORMAL, wait=True)
+        if response is None:
+            raise CachetUnavailableError(url)
+        return response.text
+
+    def get_current_status(self, component_id):
+        """Retrieves the current status of the component, going through the cachet rate limiter.
+        :return: the component status.
+        """
+        get_status_request = self.call_cachet('get', '/components/%s' % (component_id,), priority=PRIORITY_NORMAL,
+                                              wait=True)
+        if get_status_request is None:
+            raise CachetUnavailableError('%s/components/%s' % (self.api_url, component_id))
+        if get_status_request.ok:
+            return get_status_request.json()['data']['status']
+        raise ComponentNonexistentError(component_id)
+
     def update_urls(self):
         """ Call get_monitoring_urls() to update the urls and re-initialize the variables related
-        to status of each component.
+        to status of each component. The components are only replaced once the discovery is done, so the
+        checks can keep running meanwhile.
         """
-        self.get_monitoring_urls()
+        components = self.get_monitoring_urls()
+        # We need the current status so we monitor the status changes. This is necessary for creating incidents.
+        statuses = self.map(self.get_current_status, components['component_ids'])
         # initialize other variables
-        self.current_timestamps = [-1 for i in range(self.num_urls)]
-        self.messages = ["" for i in range(self.num_urls)]
-        self.statuses = [get_current_status(self.api_url, self.component_ids[i], self.headers) for i in range(self.num_urls)]
-        self.requests = [-1 for i in range(self.num_urls)]
-        self.trigger_updates = [True for i in range(self.num_urls)] 
-        self.current_fails = [0 for i in range(self.num_urls)]
-        self.incident_ids = [-1 for i in range(self.num_urls)]
-        self.versions = ["" for i in range(self.num_urls)]
+        self.set_components(components, statuses)
+        self.save_state()
 
 
     def get_action(self):
@@ -251,18 +537,20 @@ class Configuration(object):
         else:
             return self.data['cachet']['action']
 
-    def validate(self):
+    def validate(self, data=None):
         """Validates the configuration by verifying the mandatory fields are
         present and in the correct format. If the validation fails, a
         ConfigurationValidationError is raised. Otherwise nothing will happen.
         """
+        if data is None:
+            data = self.data
         configuration_errors = []
         for key, sub_entries in configuration_mandatory_fields.iteritems():
-            if key not in self.data:
+            if key not in data:
                 configuration_errors.append(key)
 
             for sub_key in sub_entries:
-                if sub_key not in self.data[key]:
+                if sub_key not in data[key]:
                     configuration_errors.append('%s.%s' % (key, sub_key))
 
         # we don't validate endpoint because we will provide the endpoint urls here, not in the config
@@ -278,53 +566,213 @@ class Configuration(object):
                 'Config file [%s] failed validation. Missing keys: %s' % (self.config_file,
                                                                           ', '.join(configuration_errors)))
 
+    @synchronized
     def evaluate(self):
-        """Sends the request to the URL set in the configuration and executes
-        each one of the expectations, one by one. The status will be updated
-        according to the expectation results.
+        """Sends the request to each one of the URLs and then executes each one of the expectations against all
+        the responses at once. The status will be updated according to the expectation results. When the endpoint
+        concurrency is set, the URLs are checked concurrently by a pool of workers and the sweep gives up waiting
+        once the frequency has passed.
         """
+        started = time.time()
+        checks = [(self.component_ids[i], self.endpoint_urls[i], self.endpoint_version_urls[i],
+                   self.endpoint_breakers[i]) for i in range(self.num_urls)]
+        if self.concurrency <= 1:
+            results = [(check[0], self.probe_url(*check[1:])) for check in checks]
+        else:
+            results = self.probe_concurrently(checks, started)
+        indices = self.apply_results(results)
+        self.evaluate_responses(indices)
+
+        # Only the checks that got a response during this sweep have a latency.
+        responded = set(indices)
+        latencies = [self.requests[i].elapsed.total_seconds() if i in responded else None
+                     for i in range(self.num_urls)]
+        self.record_history(started, latencies)
+        if self.recorder is not None:
+            self.recorder.record_sweep(started, self.statuses, self.messages, latencies)
+        self.take_snapshot()
+
+    def record_history(self, started, latencies):
+        """Adds the status and latency of every component to its history."""
         for i in range(self.num_urls):
+            self.histories[self.component_ids[i]].add(started, self.statuses[i], latencies[i])
+
+    def map(self, func, items):
+        """Applies the function to every item, concurrently when the endpoint concurrency is set."""
+        if self.concurrency <= 1:
+            return [func(item) for item in items]
+        return self.get_pool().map(func, items)
+
+    def get_pool(self):
+        """Returns the pool of workers used for the concurrent checks, creating it on first use."""
+        if self.pool is None:
+            self.pool = ThreadPool(self.concurrency)
+        return self.pool
+
+    def probe_concurrently(self, checks, started):
+        """Runs the checks on the pool of workers until they are all done or the frequency has passed. The checks
+        left running finish in the background and their results are dropped, so their components are skipped until
+        then instead of being checked twice at the same time.
+        :return: list of (component id, result of probe_url()) tuples of the checks done during this sweep.
+        """
+        with self.probing_lock:
+            checks = [check for check in checks if check[0] not in self.probing]
+            self.probing.update(check[0] for check in checks)
+        results = []
+        iterator = self.get_pool().imap_unordered(self.probe_component, checks)
+        try:
+            for check in checks:
+                results.append(iterator.next(max(started + self.data['frequency'] - time.time(), 0)))
+        except multiprocessing.TimeoutError:
+            self.logger.warning('Checks did not finish in %s seconds' % (self.data['frequency'],))
+        return results
+
+    def probe_component(self, check):
+        """Runs a check on a worker of the pool.
+        :return: the component id and the result of probe_url().
+        """
+        component_id = check[0]
+        try:
+            return component_id, self.probe_url(*check[1:])
+        finally:
+            with self.probing_lock:
+                self.probing.discard(component_id)
+
+    def probe_url(self, url, version_url, breaker):
+        """Sends the request to the URL and gets its build version. The components aren't changed here, as the
+        check may finish after the sweep that started it.
+        :return: (response, status, message, version) tuple. The response is None when there's nothing for the
+        expectations to evaluate, in which case the status and message are the ones of the failed request, or None
+        to keep the last ones. The version is None when there's no version URL.
+        """
+        if not breaker.allow():
+            # The endpoint is hard-down, so we keep its last status instead of waiting for it to time out again.
+            return None, None, None, None
+        kwargs = {}
+        if self.body_cache and self.conditional_requests:
+            # The server can skip sending the body if it didn't change.
+            headers = self.response_cache.conditional_headers(
+                url, [expectation for expectation in self.expectations if expectation.body_based])
+            # Requests with headers aren't coalesced, so we only pass them when there's any.
+            if headers:
+                kwargs['headers'] = headers
+        try:
+            response = self.prober.request(self.endpoint_method, url, timeout=self.endpoint_timeout, **kwargs)
+        except requests.ConnectionError:
+            message = 'The URL is unreachable: %s %s' % (self.endpoint_method, url)
+            self.logger.warning(message)
+            breaker.failure()
+            return None, st.COMPONENT_STATUS_PARTIAL_OUTAGE, message, None
+        except requests.HTTPError:
+            message = 'Unexpected HTTP response'
+            self.logger.exception(message)
+            breaker.failure()
+            return None, st.COMPONENT_STATUS_PARTIAL_OUTAGE, message, None
+        except requests.Timeout:
+            message = 'Request timed out'
+            self.logger.warning(message)
+            breaker.failure()
+            return None, st.COMPONENT_STATUS_PERFORMANCE_ISSUES, message, None
+        breaker.success()
+
+        # obtain the build version
+        version = None
+        if version_url:
             try:
-                self.requests[i] = requests.request(self.endpoint_method, self.endpoint_urls[i], timeout=self.endpoint_timeout)
-                self.current_timestamps[i] = int(time.time())
-            except requests.ConnectionError:
-                self.messages[i] = 'The URL is unreachable: %s %s' % (self.endpoint_method, self.endpoint_urls[i])
-                self.logger.warning(self.messages[i])
-                self.statuses[i] = st.COMPONENT_STATUS_PARTIAL_OUTAGE
-                continue
-            except requests.HTTPError:
-                self.messages[i] = 'Unexpected HTTP response'
-                self.logger.exception(self.messages[i])
-                self.statuses[i] = st.COMPONENT_STATUS_PARTIAL_OUTAGE
-                continue
-            except requests.Timeout:
-                self.messages[i] = 'Request timed out'
-                self.logger.warning(self.messages[i])
-                self.statuses[i] = st.COMPONENT_STATUS_PERFORMANCE_ISSUES
-                continue
+                r = self.prober.request('GET', version_url, timeout=self.endpoint_timeout)
+            except requests.RequestException:
+                r = None
+            if r is not None and r.status_code == requests.codes.ok:
+                build_version = r.text.split(' --> ')[0]
+                version = build_version.split(':')[1]
+            else:
+                version = 'Unknown'
+        return response, None, None, version
 
-            # obtain the build version
-            if self.endpoint_version_urls[i]:
-                r = requests.get(self.endpoint_version_urls[i])
-                if r.status_code == requests.codes.ok:
-                    build_version = r.text.split(' --> ')[0]
-                    self.versions[i] = build_version.split(':')[1]
-                else:
-                    self.versions[i] = 'Unknown'
+    def apply_results(self, results):
+        """Applies the results of the checks to their components.
+        :param results: list of (component id, result of probe_url()) tuples.
+        :return: the indices of the components with a response for the expectations to evaluate.
+        """
+        positions = dict((component_id, i) for i, component_id in enumerate(self.component_ids))
+        indices = []
+        for component_id, (response, status, message, version) in results:
+            i = positions[component_id]
+            if response is None:
+                if status is not None:
+                    self.statuses[i] = status
+                    self.messages[i] = message
+                continue
+            self.requests[i] = response
+            self.current_timestamps[i] = int(time.time())
+            if version is not None:
+                self.versions[i] = version
             print 'service:', self.component_names[i], 'version:', self.versions[i]
+            indices.append(i)
+        return indices
 
-            # We initially assume the API is healthy.
-            self.statuses[i] = st.COMPONENT_STATUS_OPERATIONAL
+    def evaluate_responses(self, indices):
+        """Executes each one of the expectations against the responses of the given URLs at once. The status of
+        each URL is the worst status of its expectations and its message comes from the first expectation with
+        that status.
+        """
+        if not indices:
+            return
+        digests = [None] * len(indices)
+        verdicts = [None] * len(indices)
+        if self.body_cache:
+            for j, i in enumerate(indices):
+                self.requests[i], digests[j], verdicts[j] = self.response_cache.lookup(self.endpoint_urls[i],
+                                                                                       self.requests[i])
+        sweep = Sweep([self.requests[i] for i in indices])
+
+        # One row per expectation, with the status of every URL.
+        rows = []
+        body_verdicts = [{} for i in indices]
+        for expectation in self.expectations:
+            if not expectation.body_based:
+                rows.append(expectation.get_statuses(sweep))
+                continue
+            row = []
+            for j, response in enumerate(sweep.responses):
+                if verdicts[j] is not None and expectation in verdicts[j]:
+                    # The body didn't change since this expectation last looked at it.
+                    status, message = verdicts[j][expectation]
+                else:
+                    status = expectation.get_status(response)
+                    message = None
+                    if status != st.COMPONENT_STATUS_OPERATIONAL:
+                        message = expectation.get_message(response)
+                body_verdicts[j][expectation] = (status, message)
+                row.append(status)
+            rows.append(row)
+
+        # The greater the status is, the worse the state of the API is.
+        worst_statuses, worst_expectations = sweep.worst(rows)
+        for j, i in enumerate(indices):
+            self.statuses[i] = int(worst_statuses[j])
             self.messages[i] = ''
-            for expectation in self.expectations:
-                status = expectation.get_status(self.requests[i])
-                # self.logger.info('Component %d check: expectation status [%d]' % (self.component_ids[i], status,))
-                # The greater the status is, the worse the state of the API is.
-                if status > self.statuses[i]:
-                    self.statuses[i] = status
-                    self.messages[i] = expectation.get_message(self.requests[i])
-                    self.logger.info(self.messages[i])
-        
+            if self.statuses[i] != st.COMPONENT_STATUS_OPERATIONAL:
+                expectation = self.expectations[worst_expectations[j]]
+                message = body_verdicts[j].get(expectation, (None, None))[1]
+                self.messages[i] = message if message is not None else expectation.get_message(self.requests[i])
+                self.logger.info(self.messages[i])
+            if self.body_cache:
+                self.response_cache.store(self.endpoint_urls[i], self.requests[i], digests[j], body_verdicts[j])
+
+    def get_stats(self):
+        """Returns the counters of the monitor's caches and the metrics of all the components over each history
+        window.
+        """
+        fleet = self.fleet_history
+        return {
+            'dns': self.prober.dns_cache.stats(),
+            'components': self.num_urls,
+            'history': dict((window, {'uptime': fleet.uptime(window), 'availability': fleet.availability(window),
+                                      'latency': fleet.latency(window), 'mttr': fleet.mttr(window)})
+                            for window in fleet.windows),
+        }
+
     def print_out(self):
         self.logger.info('Current configuration:\n%s' % (self.__repr__()))
 
@@ -334,6 +782,7 @@ class Configuration(object):
         del temporary_data['cachet']['token']
         return dump(temporary_data, default_flow_style=False)
 
+    @synchronized
     def if_trigger_update(self):
         """
         Checks if update should be triggered - trigger it for all operational states
@@ -349,17 +798,72 @@ class Configuration(object):
             self.current_fails[i] = 0
             self.trigger_updates[i] = True
 
+    def call_cachet(self, method, path, params=None, priority=PRIORITY_NORMAL, wait=False):
+        """Sends a request to the given path of the cachet API.
+        :return: the response, or None if cachet couldn't be reached.
+        """
+        return self.request_cachet(method, '%s%s' % (self.api_url, path), params, priority, wait)
+
+    def request_cachet(self, method, url, params=None, priority=PRIORITY_NORMAL, wait=False):
+        """Sends a request to cachet once the rate limiter lets it through, unless cachet has been failing and
+        its circuit breaker is open. When cachet throttles us, every call waits as long as it asked and this one is
+        sent again. A call waits at most max_wait for the rate limiter and is only sent again once, unless `wait` is
+        set: the discovery reads wait for as long as cachet asks them to, until the next discovery is due.
+        :return: the response, or None if cachet couldn't be reached or the call was dropped by the rate limiter.
+        """
+        deadline = time.time() + self.data['update_urls_frequency'] if wait else None
+        attempts = 0
+        while True:
+            if not self.cachet_breaker.allow():
+                self.logger.warning('Cachet is unavailable, skipping %s %s' % (method.upper(), url))
+                return None
+            timeout = max(deadline - time.time(), 0) if wait else self.cachet_max_wait
+            if not self.cachet_limiter.acquire(priority, timeout):
+                self.logger.warning('Cachet rate limit reached, dropping %s %s' % (method.upper(), url))
+                return None
+            try:
+                response = getattr(requests, method)(url, params=params, headers=self.headers,
+                                                     timeout=self.cachet_timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                self.logger.warning('Cachet is unreachable: %s %s' % (method.upper(), url))
+                self.cachet_breaker.failure()
+                return None
+            if response.status_code >= 500:
+                self.cachet_breaker.failure()
+            else:
+                self.cachet_breaker.success()
+            if response.status_code != 429:
+                return response
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            self.logger.warning('Cachet is throttling us, waiting %.1f seconds' % (retry_after,))
+            self.cachet_limiter.pause(retry_after)
+            attempts += 1
+            if (attempts == 2 and not wait) or (wait and time.time() >= deadline):
+                return None
+
+    @synchronized
     def push_status(self):
         """Pushes the status of the component to the cachet server. It will update the component
         status based on the previous call to evaluate().
         """
+        dropped = False
         for i in range(self.num_urls):
-            if not self.trigger_updates[i]:
+            # Updates that didn't make it while cachet was unavailable are sent even if nothing changed since.
+            if not self.trigger_updates[i] and self.component_ids[i] not in self.pending_updates:
+                continue
+            if dropped:
+                # Cachet is unavailable or throttling us, so we don't wait for it again for every component.
+                self.pending_updates.add(self.component_ids[i])
                 continue
             # added push version number to the description        
             params = {'id': self.component_ids[i], 'status': self.statuses[i], 'description': self.versions[i]}
-            component_request = requests.put('%s/components/%d' % (self.api_url, self.component_ids[i]), params=params,
-                                            headers=self.headers)
+            component_request = self.call_cachet('put', '/components/%d' % (self.component_ids[i],), params,
+                                                 PRIORITY_LOW)
+            if component_request is None:
+                self.pending_updates.add(self.component_ids[i])
+                dropped = True
+                continue
+            self.pending_updates.discard(self.component_ids[i])
             if component_request.ok:
                 # Successful update
                 self.logger.info('Component %s [id %d] update: status [%d]' % (self.component_names[i], self.component_ids[i], self.statuses[i],))
@@ -368,6 +872,7 @@ class Configuration(object):
                 self.logger.warning('Component %d update failed with status [%d]: API'
                                     ' status: [%d]' % (self.component_ids[i], component_request.status_code, self.statuses[i]))
 
+    @synchronized
     def push_metrics(self):
         """Pushes the total amount of seconds the request took to get a response from the URL.
         It only will send a request if the metric id was set in the configuration.
@@ -379,9 +884,11 @@ class Configuration(object):
                                                                                                     self.request.elapsed.total_seconds())
             params = {'id': self.metric_id, 'value': value,
                       'timestamp': self.current_timestamp}
-            metrics_request = requests.post('%s/metrics/%d/points' % (self.api_url, self.metric_id), params=params,
-                                            headers=self.headers)
+            metrics_request = self.call_cachet('post', '/metrics/%d/points' % (self.metric_id,), params,
+                                               PRIORITY_LOW)
 
+            if metrics_request is None:
+                return
             if metrics_request.ok:
                 # Successful metrics upload
                 self.logger.info('Metric uploaded: %.6f seconds' % (value,))
@@ -389,51 +896,179 @@ class Configuration(object):
                 self.logger.warning('Metric upload failed with status [%d]' %
                                     (metrics_request.status_code,))
 
+    @synchronized
     def push_incident(self):
         """If the component status has changed, we create a new incident (if this is the first time it becomes unstable)
-        or updates the existing incident once it becomes healthy again.
+        or updates the existing incident once it becomes healthy again. Components failing together are correlated
+        and share a single incident, the remaining affected components are updated concurrently.
         """
+        recovered = []
+        failures = []
         for i in range(self.num_urls):
             if not self.trigger_updates[i]:
                 continue
             if self.incident_ids[i] != -1 and self.statuses[i] == st.COMPONENT_STATUS_OPERATIONAL:
-                # If the incident already exists, it means it was unhealthy but now it's healthy again.
-                params = {'status': 4, 'visible': self.public_incidents, 'component_id': self.component_ids[i],
-                        'component_status': self.statuses[i],
-                        'notify': True}
-
-                incident_request = requests.put('%s/incidents/%d' % (self.api_url, self.incident_ids[i]), params=params,
-                                                headers=self.headers)
-                if incident_request.ok:
-                    # Successful metrics upload
-                    self.logger.info(
-                        'Incident updated, API healthy again: component status [%d], message: "%s"' % (
-                            self.statuses[i], self.messages[i]))
-                    self.incident_ids[i] = -1
-                else:
-                    self.logger.warning('Incident update failed with status [%d], message: "%s"' % (
-                        incident_request.status_code, self.messages[i]))
+                recovered.append(i)
             elif self.incident_ids[i] == -1 and self.statuses[i] != st.COMPONENT_STATUS_OPERATIONAL:
-                # This is the first time the incident is being created.
-                params = {'name': 'URL unavailable', 'message': self.messages[i], 'status': 1, 'visible': self.public_incidents,
-                        'component_id': self.component_ids[i], 'component_status': self.statuses[i], 'notify': True}
-                incident_request = requests.post('%s/incidents' % (self.api_url,), params=params, headers=self.headers)
-                if incident_request.ok:
-                    # Successful incident upload.
-                    self.incident_ids[i] = incident_request.json()['data']['id']
-                    self.logger.info(
-                        'Incident uploaded, API unhealthy: component status [%d], message: "%s"' % (
-                            self.statuses[i], self.messages[i]))
-                else:
-                    self.logger.warning(
-                        'Incident upload failed with status [%d], message: "%s"' % (
-                            incident_request.status_code, self.messages[i]))
+                failures.append(i)
+
+        component_updates = []
+        for i in recovered:
+            if self.correlator.resolve(self.incident_ids[i], self.component_ids[i]):
+                self.resolve_incident(i)
+            else:
+                # Other components are still affected by this incident, so we only restore this one.
+                self.incident_ids[i] = -1
+                component_updates.append(i)
+
+        keys = [(i, self.correlator.correlation_key(self.component_names[i], self.endpoint_urls[i]))
+                for i in failures]
+        for key, incident_id, indices in self.correlator.cluster(keys):
+            if incident_id is None:
+                incident_id = self.create_incident(indices)
+                if incident_id is None:
+                    continue
+                # The incident itself updates the status of its component.
+                component_updates.extend(indices[1:])
+            else:
+                self.logger.info('Components %s joined incident %d' % (
+                    ', '.join(self.component_names[i] for i in indices), incident_id))
+                component_updates.extend(indices)
+            self.correlator.register(key, incident_id, [self.component_ids[i] for i in indices])
+            for i in indices:
+                self.incident_ids[i] = incident_id
+
+        self.update_components(component_updates)
+        if recovered or failures:
+            self.save_state()
+
+    def create_incident(self, indices):
+        """Creates one incident for all the given components. The first component is attached to the incident.
+        :return: the incident id or None if the creation failed.
+        """
+        i = indices[0]
+        if len(indices) == 1:
+            name = 'URL unavailable'
+            message = self.messages[i]
+        else:
+            name = 'URL unavailable (%d components)' % (len(indices),)
+            message = '\n'.join('%s: %s' % (self.component_names[j], self.messages[j]) for j in indices)
+        params = {'name': name, 'message': message, 'status': 1, 'visible': self.public_incidents,
+                  'component_id': self.component_ids[i], 'component_status': self.statuses[i], 'notify': True}
+        incident_request = self.call_cachet('post', '/incidents', params, PRIORITY_HIGH)
+        if incident_request is None:
+            return None
+        if incident_request.ok:
+            # Successful incident upload.
+            self.logger.info(
+                'Incident uploaded, API unhealthy: component status [%d], message: "%s"' % (
+                    self.statuses[i], message))
+            return incident_request.json()['data']['id']
+        else:
+            self.logger.warning(
+                'Incident upload failed with status [%d], message: "%s"' % (
+                    incident_request.status_code, message))
+            return None
+
+    def resolve_incident(self, i):
+        """Marks the incident of the component as fixed, as the component is healthy again."""
+        params = {'status': 4, 'visible': self.public_incidents, 'component_id': self.component_ids[i],
+                  'component_status': self.statuses[i],
+                  'notify': True}
+
+        incident_request = self.call_cachet('put', '/incidents/%d' % (self.incident_ids[i],), params,
+                                            PRIORITY_HIGH)
+        if incident_request is None:
+            return
+        if incident_request.ok:
+            # Successful metrics upload
+            self.logger.info(
+                'Incident updated, API healthy again: component status [%d], message: "%s"' % (
+                    self.statuses[i], self.messages[i]))
+            self.incident_ids[i] = -1
+        else:
+            self.logger.warning('Incident update failed with status [%d], message: "%s"' % (
+                incident_request.status_code, self.messages[i]))
+
+    def close_incident(self, incident_id):
+        """Marks the incident as fixed, as none of its components are monitored anymore."""
+        params = {'status': 4, 'visible': self.public_incidents, 'notify': True}
+
+        incident_request = self.call_cachet('put', '/incidents/%d' % (incident_id,), params, PRIORITY_HIGH)
+        if incident_request is None:
+            return
+        if incident_request.ok:
+            self.logger.info('Incident %d closed, its components are not monitored anymore' % (incident_id,))
+        else:
+            self.logger.warning('Incident %d update failed with status [%d]' % (
+                incident_id, incident_request.status_code))
+
+    def update_component(self, i):
+        """Updates the status of a single component."""
+        params = {'id': self.component_ids[i], 'status': self.statuses[i]}
+        # These updates are part of the incidents, so they have their priority.
+        component_request = self.call_cachet('put', '/components/%d' % (self.component_ids[i],), params,
+                                             PRIORITY_HIGH)
+        if component_request is None:
+            self.pending_updates.add(self.component_ids[i])
+            return
+        if component_request.ok:
+            self.logger.info('Component %s [id %d] update: status [%d]' % (
+                self.component_names[i], self.component_ids[i], self.statuses[i],))
+        else:
+            self.logger.warning('Component %d update failed with status [%d]: API status: [%d]' % (
+                self.component_ids[i], component_request.status_code, self.statuses[i]))
+
+    def update_components(self, indices):
+        """Updates the status of the given components concurrently."""
+        if len(indices) <= 1:
+            for i in indices:
+                self.update_component(i)
+            return
+        pool = ThreadPool(min(len(indices), self.cachet_workers))
+        try:
+            pool.map(self.update_component, indices)
+        finally:
+            pool.close()
+            pool.join()
+
+
+class Sweep(object):
+    """The responses of the URLs checked in a sweep. Their attributes are extracted once into arrays, so the
+    expectations can evaluate all the responses at once.
+    """
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.columns = {}
+
+    def column(self, name, get):
+        """Returns get(response) of every response, as a numpy array when it's available."""
+        if name not in self.columns:
+            values = [get(response) for response in self.responses]
+            self.columns[name] = values if numpy is None else numpy.array(values)
+        return self.columns[name]
+
+    def worst(self, rows):
+        """Takes the status of every response for each expectation.
+        :return: the worst status of each response and the index of the first expectation with that status.
+        """
+        if not rows:
+            return [st.COMPONENT_STATUS_OPERATIONAL] * len(self.responses), [None] * len(self.responses)
+        if numpy is not None:
+            matrix = numpy.array(rows)
+            return matrix.max(axis=0), matrix.argmax(axis=0)
+        columns = zip(*rows)
+        worst_statuses = [max(column) for column in columns]
+        return worst_statuses, [column.index(status) for column, status in zip(columns, worst_statuses)]
 
 
 class Expectaction(object):
     """Base class for URL result expectations. Any new excpectation should extend
     this class and the name added to create() method.
     """
+    # Expectations looking into the response body set this, so their results can be reused while it doesn't change.
+    body_based = False
 
     @staticmethod
     def create(configuration):
@@ -457,6 +1092,12 @@ class Expectaction(object):
     def get_message(self, response):
         """Gets the error message."""
 
+    def get_statuses(self, sweep):
+        """Returns the status of every response of the sweep. Expectations that can evaluate the whole sweep at
+        once override this.
+        """
+        return [self.get_status(response) for response in sweep.responses]
+
 
 class HttpStatus(Expectaction):
     def __init__(self, configuration):
@@ -478,6 +1119,13 @@ class HttpStatus(Expectaction):
         else:
             return st.COMPONENT_STATUS_PARTIAL_OUTAGE
 
+    def get_statuses(self, sweep):
+        if numpy is None:
+            return Expectaction.get_statuses(self, sweep)
+        status_codes = sweep.column('status_code', operator.attrgetter('status_code'))
+        return numpy.where((status_codes >= self.status_range[0]) & (status_codes < self.status_range[1]),
+                           st.COMPONENT_STATUS_OPERATIONAL, st.COMPONENT_STATUS_PARTIAL_OUTAGE)
+
     def get_message(self, response):
         return 'Unexpected HTTP status (%s)' % (response.status_code,)
 
@@ -488,21 +1136,44 @@ class HttpStatus(Expectaction):
 class Latency(Expectaction):
     def __init__(self, configuration):
         self.threshold = configuration['threshold']
+        # Without a phase, we measure the time until the response headers were parsed.
+        self.phase = configuration.get('phase')
+        if self.phase is not None and self.phase not in PHASES:
+            raise ValueError('Invalid latency phase: %s' % (self.phase,))
+
+    def get_latency(self, response):
+        if self.phase is None:
+            return response.elapsed.total_seconds()
+        return getattr(response.timings, self.phase)
 
     def get_status(self, response):
-        if response.elapsed.total_seconds() <= self.threshold:
+        if self.get_latency(response) <= self.threshold:
             return st.COMPONENT_STATUS_OPERATIONAL
         else:
             return st.COMPONENT_STATUS_PERFORMANCE_ISSUES
 
+    def get_statuses(self, sweep):
+        if numpy is None:
+            return Expectaction.get_statuses(self, sweep)
+        # Latency expectations measuring the same phase share the same column.
+        latencies = sweep.column(('latency', self.phase), self.get_latency)
+        return numpy.where(latencies <= self.threshold, st.COMPONENT_STATUS_OPERATIONAL,
+                           st.COMPONENT_STATUS_PERFORMANCE_ISSUES)
+
     def get_message(self, response):
-        return 'Latency above threshold: %.4f seconds' % (response.elapsed.total_seconds(),)
+        if self.phase is None:
+            return 'Latency above threshold: %.4f seconds' % (self.get_latency(response),)
+        return 'Latency above threshold (%s): %.4f seconds' % (self.phase, self.get_latency(response))
 
     def __str__(self):
-        return repr('Latency threshold: %.4f seconds' % (self.threshold,))
+        if self.phase is None:
+            return repr('Latency threshold: %.4f seconds' % (self.threshold,))
+        return repr('Latency threshold (%s): %.4f seconds' % (self.phase, self.threshold))
 
 
 class Regex(Expectaction):
+    body_based = True
+
     def __init__(self, configuration):
         self.regex_string = configuration['regex']
         self.regex = re.compile(configuration['regex'], re.UNICODE + re.DOTALL)
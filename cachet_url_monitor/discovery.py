@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""
+Cache of the discovery requests, the walker files and cachet's components, shared by all the configurations
+running in the same process, and the naming convention of the discovered components.
+"""
+import threading
+import time
+
+
+def parse_component_name(name):
+    """Splits the name of a discovered component, which follows the service-center-env convention.
+    :return: the (service, center, env) tuple, or None if the name doesn't follow the convention.
+    """
+    parts = name.split('-')
+    return tuple(parts) if len(parts) == 3 else None
+
+
+class DiscoveryCache(object):
+    """Keeps the body of each discovery response for `ttl` seconds, so configurations discovering the same sources
+    only fetch them once. Concurrent lookups of the same url wait for the first fetch instead of repeating it.
+    """
+
+    def __init__(self, ttl=0, clock=time.time):
+        self.ttl = ttl
+        self.clock = clock
+        # Fetch time and body of each url.
+        self.entries = {}
+        self.url_locks = {}
+        self.lock = threading.Lock()
+
+    def get(self, url, fetch):
+        """Returns the body of the url, calling fetch(url) if it isn't cached yet or its entry expired."""
+        with self.lock:
+            url_lock = self.url_locks.setdefault(url, threading.Lock())
+        with url_lock:
+            entry = self.entries.get(url)
+            if entry is not None and self.clock() - entry[0] < self.ttl:
+                return entry[1]
+            body = fetch(url)
+            if self.ttl > 0:
+                self.entries[url] = (self.clock(), body)
+            return body
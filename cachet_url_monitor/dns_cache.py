@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Cache of the name resolutions made by the probes. Most endpoints live on a few hosts, so resolving them once per
+TTL instead of once per check saves hundreds of lookups per sweep and keeps a slow resolver out of the latency.
+"""
+import logging
+import socket
+import threading
+import time
+
+
+class DNSEntry(object):
+    __slots__ = ['addresses', 'error', 'resolved_at', 'refreshing']
+
+    def __init__(self, addresses, error, resolved_at):
+        self.addresses = addresses
+        self.error = error
+        self.resolved_at = resolved_at
+        self.refreshing = False
+
+
+class DNSCache(object):
+    """Keeps the addresses of each host for `ttl` seconds and the failures to resolve it for `negative_ttl`
+    seconds. Once an entry in use is older than `refresh_ahead` times its TTL, it's refreshed in the background, so
+    the hosts checked regularly never wait for the resolver. The resolver doesn't tell us the TTL of the records,
+    so the configured one is used for every host.
+    """
+
+    def __init__(self, resolver, ttl=60, negative_ttl=5, refresh_ahead=0.75, clock=time.time):
+        self.logger = logging.getLogger('cachet_url_monitor.dns_cache.DNSCache')
+        self.resolver = resolver
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.refresh_ahead = refresh_ahead
+        self.clock = clock
+        self.entries = {}
+        self.host_locks = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.refreshes = 0
+
+    def resolve(self, host, port):
+        """Returns the addresses of the host, resolving it only if it isn't cached or its entry expired. A cached
+        failure is raised again.
+        """
+        if self.ttl <= 0:
+            return self.resolver(host, port)
+
+        key = (host, port)
+        with self.lock:
+            host_lock = self.host_locks.setdefault(key, threading.Lock())
+        with host_lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.clock() - entry.resolved_at < self.get_ttl(entry):
+                self.count_hit(entry)
+                if entry.error is None and not entry.refreshing and \
+                        self.clock() - entry.resolved_at >= self.ttl * self.refresh_ahead:
+                    entry.refreshing = True
+                    refresh = threading.Thread(target=self.refresh, args=(key,), name='dns-refresh')
+                    refresh.daemon = True
+                    refresh.start()
+            else:
+                with self.lock:
+                    self.misses += 1
+                entry = self.lookup(key)
+                self.entries[key] = entry
+        if entry.error is not None:
+            raise entry.error
+        return entry.addresses
+
+    def get_ttl(self, entry):
+        return self.ttl if entry.error is None else self.negative_ttl
+
+    def count_hit(self, entry):
+        with self.lock:
+            if entry.error is None:
+                self.hits += 1
+            else:
+                self.negative_hits += 1
+
+    def lookup(self, key):
+        try:
+            return DNSEntry(self.resolver(*key), None, self.clock())
+        except socket.error as e:
+            return DNSEntry(None, e, self.clock())
+
+    def refresh(self, key):
+        """Resolves the host again in the background. If it fails, the current addresses are kept until they
+        expire.
+        """
+        entry = self.lookup(key)
+        with self.lock:
+            self.refreshes += 1
+            if entry.error is None:
+                self.entries[key] = entry
+                return
+            self.entries[key].refreshing = False
+        self.logger.warning('Failed to refresh the addresses of %s: %s' % (key[0], entry.error))
+
+    def stats(self):
+        """Returns the hit and miss counters and how many hosts are cached."""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'negative_hits': self.negative_hits,
+                'refreshes': self.refreshes,
+                'hosts': len(self.entries),
+            }
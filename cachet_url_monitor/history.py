@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+"""
+In-process history of the components statuses. Each component keeps its last samples in fixed size arrays, and the
+uptime, availability, latency and MTTR over several time windows are updated as samples are added, so reading them
+is O(1), for a single component or for the whole fleet.
+"""
+from array import array
+
+import status as st
+
+# The windows, in seconds, used by default: one hour and one day.
+DEFAULT_WINDOWS = [3600, 86400]
+
+# Columns of the samples: the sample itself, operational, available, latency and whether the latency was measured.
+SAMPLE_TYPECODES = 'BBBfB'
+# Columns of the repairs: the repair itself and how long the outage lasted.
+REPAIR_TYPECODES = 'Bf'
+
+
+class WindowTotals(object):
+    """Sum of each column over each window."""
+
+    def __init__(self, windows, columns):
+        self.windows = windows
+        self.sums = [[0] * columns for window in windows]
+
+    def ratio(self, window, numerator, denominator):
+        sums = self.sums[self.windows.index(window)]
+        if sums[denominator] == 0:
+            return None
+        return float(sums[numerator]) / sums[denominator]
+
+
+class RollingSums(object):
+    """Ring buffer of timestamped rows that keeps the sum of each column over several time windows. Every change to
+    the sums is also applied to the parent totals, if any.
+    """
+
+    def __init__(self, capacity, windows, typecodes, parent=None):
+        self.capacity = capacity
+        self.windows = windows
+        self.timestamps = array('d', [0.0]) * capacity
+        self.columns = [array(typecode, [0]) * capacity for typecode in typecodes]
+        self.count = 0
+        # The oldest row still inside each window.
+        self.tails = [0] * len(windows)
+        self.totals = WindowTotals(windows, len(typecodes))
+        self.parent = parent
+
+    def append(self, timestamp, values):
+        index = self.count % self.capacity
+        if self.count >= self.capacity:
+            # The row we are about to overwrite must leave the windows still holding it.
+            for window in range(len(self.windows)):
+                if self.tails[window] <= self.count - self.capacity:
+                    self.remove(window)
+
+        self.timestamps[index] = timestamp
+        for column, value in zip(self.columns, values):
+            column[index] = value
+        self.count += 1
+
+        # We add the values as they were stored, which may be less precise than the given ones, so removing them
+        # later takes off exactly what was added.
+        stored_values = [column[index] for column in self.columns]
+        for window in range(len(self.windows)):
+            self.add(window, stored_values)
+        self.expire(timestamp)
+
+    def expire(self, now):
+        """Removes from each window the rows older than it."""
+        for window, length in enumerate(self.windows):
+            while self.tails[window] < self.count and \
+                    self.timestamps[self.tails[window] % self.capacity] <= now - length:
+                self.remove(window)
+
+    def add(self, window, values):
+        for column, value in enumerate(values):
+            self.totals.sums[window][column] += value
+            if self.parent is not None:
+                self.parent.sums[window][column] += value
+
+    def remove(self, window):
+        index = self.tails[window] % self.capacity
+        for column, values in enumerate(self.columns):
+            self.totals.sums[window][column] -= values[index]
+            if self.parent is not None:
+                self.parent.sums[window][column] -= values[index]
+        self.tails[window] += 1
+
+    def clear(self):
+        """Removes every row from the windows, and so from the parent totals."""
+        for window in range(len(self.windows)):
+            while self.tails[window] < self.count:
+                self.remove(window)
+
+
+class Metrics(object):
+    """Reads the metrics out of the samples and repairs totals."""
+
+    def uptime(self, window):
+        """Ratio of the checks in the window where the components were operational."""
+        return self.sample_totals.ratio(window, 1, 0)
+
+    def availability(self, window):
+        """Ratio of the checks in the window where the components were operational or only had performance
+        issues.
+        """
+        return self.sample_totals.ratio(window, 2, 0)
+
+    def latency(self, window):
+        """Average latency, in seconds, of the checks in the window that got a response."""
+        return self.sample_totals.ratio(window, 3, 4)
+
+    def mttr(self, window):
+        """Mean time to repair, in seconds, of the outages that ended in the window."""
+        return self.repair_totals.ratio(window, 1, 0)
+
+
+class FleetHistory(Metrics):
+    """Totals of all the components histories, kept up to date by the components themselves."""
+
+    def __init__(self, windows=None):
+        self.windows = windows or DEFAULT_WINDOWS
+        self.sample_totals = WindowTotals(self.windows, len(SAMPLE_TYPECODES))
+        self.repair_totals = WindowTotals(self.windows, len(REPAIR_TYPECODES))
+
+
+class StatusHistory(Metrics):
+    """Last `capacity` samples of a component, which are part of the fleet totals."""
+
+    def __init__(self, capacity, fleet):
+        self.windows = fleet.windows
+        self.samples = RollingSums(capacity, self.windows, SAMPLE_TYPECODES, parent=fleet.sample_totals)
+        self.repairs = RollingSums(capacity, self.windows, REPAIR_TYPECODES, parent=fleet.repair_totals)
+        self.sample_totals = self.samples.totals
+        self.repair_totals = self.repairs.totals
+        self.outage_started = None
+
+    def add(self, timestamp, status, latency=None):
+        """Adds the status of a check and its latency, which is None when the check got no response."""
+        operational = status == st.COMPONENT_STATUS_OPERATIONAL
+        available = status <= st.COMPONENT_STATUS_PERFORMANCE_ISSUES
+        self.samples.append(timestamp, (1, int(operational), int(available), latency or 0.0,
+                                        int(latency is not None)))
+
+        if not operational and self.outage_started is None:
+            self.outage_started = timestamp
+        elif operational and self.outage_started is not None:
+            self.repairs.append(timestamp, (1, timestamp - self.outage_started))
+            self.outage_started = None
+        # The repairs older than the windows must leave them, whether or not there's a new one.
+        self.repairs.expire(timestamp)
+
+    def remove(self):
+        """Removes this component from the fleet totals, once it's not monitored anymore."""
+        self.samples.clear()
+        self.repairs.clear()
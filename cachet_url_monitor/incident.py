@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""
+Correlation of component failures into grouped incidents. When a whole host or data center goes down, every
+affected component fails on the same sweep and we don't want to open one incident per component.
+"""
+import time
+from collections import OrderedDict
+from urlparse import urlparse
+
+from discovery import parse_component_name
+
+INCIDENT_GROUPINGS = ['center', 'host', 'service']
+
+
+class IncidentCorrelator(object):
+    """Groups simultaneous failures by center, host or service. A cluster stays open for `window` seconds after
+    its incident is created, so components failing a few sweeps later join the same incident instead of opening
+    a new one.
+    """
+
+    def __init__(self, grouping=None, window=0, clock=time.time):
+        if grouping is not None and grouping not in INCIDENT_GROUPINGS:
+            raise ValueError('Invalid incident grouping: %s' % (grouping,))
+        self.grouping = grouping
+        self.window = window
+        self.clock = clock
+        # Open clusters by correlation key: (incident id, creation time).
+        self.clusters = {}
+        # Components still affected by each grouped incident.
+        self.members = {}
+
+    def correlation_key(self, component_name, url):
+        """Returns the key used to group this component's failures, or None if grouping is disabled or the
+        component's name doesn't tell its center and service.
+        """
+        if self.grouping is None:
+            return None
+        if self.grouping == 'host':
+            return urlparse(url).hostname
+        parts = parse_component_name(component_name)
+        if parts is None:
+            return None
+        svc_name, center, env = parts
+        return center if self.grouping == 'center' else svc_name
+
+    def cluster(self, failures):
+        """Groups the newly failing components.
+        :param failures: list of (index, correlation key) tuples.
+        :return: list of (key, incident id, indices) tuples. The incident id is the one of an open cluster the
+        components should join, or None when a new incident must be created.
+        """
+        groups = OrderedDict()
+        for index, key in failures:
+            # Components without a key are never grouped.
+            groups.setdefault(key if key is not None else (index,), []).append(index)
+
+        now = self.clock()
+        clusters = []
+        for key, indices in groups.items():
+            if isinstance(key, tuple):
+                clusters.append((None, None, indices))
+                continue
+            incident_id = None
+            if key in self.clusters:
+                incident_id, created_at = self.clusters[key]
+                if now - created_at > self.window or incident_id not in self.members:
+                    del self.clusters[key]
+                    incident_id = None
+            clusters.append((key, incident_id, indices))
+        return clusters
+
+    def register(self, key, incident_id, component_ids):
+        """Records the components affected by a grouped incident."""
+        if key is None:
+            return
+        if incident_id not in self.members:
+            self.clusters[key] = (incident_id, self.clock())
+            self.members[incident_id] = set()
+        self.members[incident_id].update(component_ids)
+
+    def restore(self, incident_ids):
+        """Records the components affected by each open incident, as they were before a restart.
+        :param incident_ids: dictionary of the open incident id of each component.
+        """
+        for component_id, incident_id in incident_ids.items():
+            self.members.setdefault(incident_id, set()).add(component_id)
+
+    def resolve(self, incident_id, component_id):
+        """Marks the component as recovered.
+        :return: True if the incident can be closed, False while other components are still affected by it.
+        """
+        members = self.members.get(incident_id)
+        if members is None:
+            return True
+        members.discard(component_id)
+        if members:
+            return False
+        del self.members[incident_id]
+        for key in [key for key, cluster in self.clusters.items() if cluster[0] == incident_id]:
+            del self.clusters[key]
+        return True
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+"""
+The probe layer sends the monitoring requests and records how long each phase of the request took: DNS
+resolution, TCP connect, TLS handshake, time to first byte and total time until the body was downloaded.
+"""
+import os
+import socket
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.connection import HTTPConnection
+from requests.packages.urllib3.connection import VerifiedHTTPSConnection
+from requests.packages.urllib3.connectionpool import HTTPConnectionPool
+from requests.packages.urllib3.connectionpool import HTTPSConnectionPool
+from requests.packages.urllib3.exceptions import ConnectTimeoutError
+from requests.packages.urllib3.exceptions import NewConnectionError
+from requests.packages.urllib3.util.connection import allowed_gai_family
+from requests.sessions import Session
+
+from dns_cache import DNSCache
+
+# Python 2 has no monotonic clock, in which case we fall back to the wall clock.
+monotonic = getattr(time, 'monotonic', time.time)
+
+PHASES = ['dns', 'connect', 'tls', 'ttfb', 'total']
+
+# The timings of the request being sent by the current thread, filled in by the connection classes below.
+_current = threading.local()
+
+
+class PhaseTimings(object):
+    """How long each phase of a request took, in seconds. The dns, connect and tls phases are zero when a pooled
+    connection was reused. ttfb and total are measured from the moment the request started.
+    """
+    __slots__ = PHASES
+
+    def __init__(self):
+        for phase in PHASES:
+            setattr(self, phase, 0.0)
+
+    def __repr__(self):
+        return 'PhaseTimings(%s)' % (', '.join('%s=%.4f' % (phase, getattr(self, phase)) for phase in PHASES),)
+
+
+def getaddrinfo(host, port):
+    return socket.getaddrinfo(host, port, allowed_gai_family(), socket.SOCK_STREAM)
+
+
+# The name resolutions are cached for the whole process, whichever prober sends the requests.
+dns_cache = DNSCache(getaddrinfo, ttl=float(os.environ.get('DNS_CACHE_TTL') or 60),
+                     negative_ttl=float(os.environ.get('DNS_NEGATIVE_TTL') or 5))
+
+
+def resolve(host, port):
+    """Resolves the host, returning the list of addresses we can connect to."""
+    return dns_cache.resolve(host, port)
+
+
+def create_connection(connection):
+    """Opens the socket of an urllib3 connection, the same way urllib3 does it, but timing the name resolution
+    and the TCP connect separately.
+    """
+    timings = getattr(_current, 'timings', None)
+    start = monotonic()
+    try:
+        addresses = resolve(connection.host, connection.port)
+    except socket.error as e:
+        raise NewConnectionError(connection, 'Failed to establish a new connection: %s' % e)
+    resolved = monotonic()
+
+    error = None
+    for family, socktype, proto, canonname, address in addresses:
+        sock = None
+        try:
+            sock = socket.socket(family, socktype, proto)
+            for option in connection.socket_options or []:
+                sock.setsockopt(*option)
+            if connection.timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                sock.settimeout(connection.timeout)
+            if connection.source_address:
+                sock.bind(connection.source_address)
+            sock.connect(address)
+            break
+        except socket.timeout:
+            if sock is not None:
+                sock.close()
+            raise ConnectTimeoutError(connection, 'Connection to %s timed out. (connect timeout=%s)' % (
+                connection.host, connection.timeout))
+        except socket.error as e:
+            error = e
+            if sock is not None:
+                sock.close()
+            sock = None
+    if sock is None:
+        raise NewConnectionError(connection, 'Failed to establish a new connection: %s' % (
+            error or 'getaddrinfo returns an empty list'))
+
+    connection.connected_at = monotonic()
+    if timings is not None:
+        timings.dns = resolved - start
+        timings.connect = connection.connected_at - resolved
+    return sock
+
+
+class TimedHTTPConnection(HTTPConnection):
+    def _new_conn(self):
+        return create_connection(self)
+
+
+class TimedHTTPSConnection(VerifiedHTTPSConnection):
+    def _new_conn(self):
+        return create_connection(self)
+
+    def connect(self):
+        VerifiedHTTPSConnection.connect(self)
+        timings = getattr(_current, 'timings', None)
+        if timings is not None:
+            timings.tls = monotonic() - self.connected_at
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """Transport adapter whose connections record their phase timings."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        HTTPAdapter.init_poolmanager(self, *args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool,
+        }
+
+
+class Flight(object):
+    """A request being sent on behalf of everyone asking for the same url."""
+
+    def __init__(self):
+        self.finished = threading.Event()
+        self.finished_at = None
+        self.response = None
+        self.error = None
+
+
+class Prober(object):
+    """Sends the monitoring requests over a pool of persistent connections. Every response it returns has a
+    `timings` attribute with the PhaseTimings of the request.
+
+    When `coalesce_window` is set, requests for the same url are coalesced: callers asking for a url that is being
+    requested, or was requested less than `coalesce_window` seconds ago, get the same response. The request is sent
+    with the timeout of the caller that sent it, the others wait for it whatever their own timeout is.
+    """
+
+    def __init__(self, pool_size=10, hosts=100, coalesce_window=0):
+        self.session = Session()
+        # We keep up to pool_size connections for each one of the most recently used hosts.
+        adapter = TimedHTTPAdapter(pool_connections=hosts, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.coalesce_window = coalesce_window
+        self.flights = {}
+        self.dns_cache = dns_cache
+        self.lock = threading.Lock()
+
+    def request(self, method, url, timeout=None, **kwargs):
+        # Requests with extra arguments, like headers, are never coalesced.
+        if not self.coalesce_window or kwargs:
+            return self.send(method, url, timeout=timeout, **kwargs)
+
+        key = (method, url)
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None or (
+                flight.finished.is_set() and monotonic() - flight.finished_at > self.coalesce_window)
+            if leader:
+                flight = Flight()
+                self.flights[key] = flight
+
+        if leader:
+            try:
+                flight.response = self.send(method, url, timeout=timeout)
+            except Exception as e:
+                flight.error = e
+            flight.finished_at = monotonic()
+            flight.finished.set()
+        else:
+            flight.finished.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.response
+
+    def send(self, method, url, timeout=None, **kwargs):
+        timings = PhaseTimings()
+        _current.timings = timings
+        start = monotonic()
+        try:
+            # Streaming the response lets us tell the time to first byte apart from the body download.
+            response = self.session.request(method, url, timeout=timeout, stream=True, **kwargs)
+            timings.ttfb = monotonic() - start
+            response.content
+            timings.total = monotonic() - start
+        finally:
+            _current.timings = None
+        response.timings = timings
+        return response
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+On demand profiling of the agent's jobs. Once armed, by a signal or by the configuration, the next runs of each job
+are profiled and a report of each run is written to disk. While it's not armed, the jobs run untouched.
+"""
+import cProfile
+import functools
+import logging
+import os
+import pstats
+import signal
+import tempfile
+import threading
+import time
+
+# The jobs that can be profiled, see profiled() below.
+PROFILED_JOBS = ['execute', 'update_urls']
+
+# How many functions are listed in the text reports.
+REPORT_LINES = 50
+
+
+def profiled(job):
+    """Profiles the agent's method when its profiler is armed for this job."""
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.profiler is None or not self.profiler.remaining.get(job):
+                return method(self, *args, **kwargs)
+            return self.profiler.run(job, method, self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class Profiler(object):
+    """Profiles the next `runs` runs of each job with cProfile. Each run is saved to `directory` both as a pstats
+    dump, to be loaded by pstats or any viewer that reads it, and as a text report sorted by cumulative time.
+    """
+
+    def __init__(self, name, directory=None, runs=1):
+        self.logger = logging.getLogger('cachet_url_monitor.profiling.Profiler')
+        self.name = name
+        self.directory = directory or tempfile.gettempdir()
+        self.runs = runs
+        # How many runs of each job are still going to be profiled.
+        self.remaining = {}
+        self.lock = threading.Lock()
+
+    def arm(self, runs=None):
+        """Profiles the next runs of every job. It's called by the signal handler, which may interrupt run() while it
+        holds the lock, so the counters are replaced at once instead of taking it.
+        """
+        runs = runs or self.runs
+        self.remaining = dict.fromkeys(PROFILED_JOBS, runs)
+        self.logger.info('Profiling the next %d runs of %s' % (runs, ', '.join(PROFILED_JOBS)))
+
+    def run(self, job, func, *args, **kwargs):
+        with self.lock:
+            remaining = self.remaining
+            if not remaining.get(job):
+                # Another thread took the last run.
+                return func(*args, **kwargs)
+            remaining[job] -= 1
+
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            self.write(job, profile)
+
+    def write(self, job, profile):
+        path = os.path.join(self.directory, '%s-%s-%s' % (
+            self.name, job, time.strftime('%Y%m%d-%H%M%S', time.localtime())))
+        # Runs finishing in the same second don't overwrite each other.
+        suffix = 0
+        while os.path.exists('%s%s.prof' % (path, '-%d' % (suffix,) if suffix else '')):
+            suffix += 1
+        if suffix:
+            path = '%s-%d' % (path, suffix)
+        try:
+            profile.dump_stats(path + '.prof')
+            with open(path + '.txt', 'w') as report:
+                pstats.Stats(profile, stream=report).sort_stats('cumulative').print_stats(REPORT_LINES)
+        except (IOError, OSError):
+            self.logger.exception('Failed to write the profile of %s to %s' % (job, self.directory))
+            return
+        self.logger.info('Profile of %s written to %s.txt' % (job, path))
+
+
+def install_signal_handler(profilers, signum=getattr(signal, 'SIGUSR1', None)):
+    """Arms the profilers whenever the process receives the signal, SIGUSR1 by default. It must be called from the
+    main thread.
+    """
+    if signum is None:
+        # The platform doesn't have this signal.
+        return
+
+    def handler(received, frame):
+        for profiler in profilers:
+            profiler.arm()
+
+    signal.signal(signum, handler)
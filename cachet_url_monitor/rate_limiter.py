@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+"""
+Rate limiter shared by all the calls to cachet, so bursts of updates don't get throttled by it. The configurations
+reporting to the same cachet share its rate limiter.
+"""
+import heapq
+import itertools
+import threading
+import time
+from email.utils import mktime_tz
+from email.utils import parsedate_tz
+
+# The lower the number, the sooner the call goes through.
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+# How long we wait when cachet throttles us without telling for how long.
+DEFAULT_RETRY_AFTER = 1
+
+
+def parse_retry_after(value, clock=time.time):
+    """Parses the Retry-After header, which is either a number of seconds or a date.
+    :return: how many seconds to wait.
+    """
+    if not value:
+        return DEFAULT_RETRY_AFTER
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        date = parsedate_tz(value)
+        if date is None:
+            return DEFAULT_RETRY_AFTER
+        return max(mktime_tz(date) - clock(), 0)
+
+
+class RateLimiter(object):
+    """Token bucket allowing `rate` calls per second, with bursts of up to `burst` calls. A rate of zero doesn't
+    limit the calls, they are only held while cachet asked us to back off.
+
+    Calls waiting for a token go through by priority, then by arrival. At most `queue_size` calls wait at the same
+    time: when the queue is full, a call is rejected unless it has a higher priority than the last one waiting, which
+    is then rejected in its place.
+    """
+
+    def __init__(self, rate=0, burst=1, queue_size=100, clock=time.time):
+        self.rate = rate
+        self.burst = burst
+        self.queue_size = queue_size
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated_at = clock()
+        self.paused_until = 0
+        # Heap of (priority, arrival, waiter) of the calls waiting for a token.
+        self.waiting = []
+        self.arrivals = itertools.count()
+        self.condition = threading.Condition()
+
+    def acquire(self, priority=PRIORITY_NORMAL, timeout=None):
+        """Waits until the call can go through.
+        :return: False if the call was rejected, because the queue is full, it waited longer than the timeout or
+        cachet asked us to back off for longer than the timeout.
+        """
+        with self.condition:
+            deadline = None if timeout is None else self.clock() + timeout
+            if self.is_paused_past(deadline):
+                return False
+            if not self.waiting and self.take():
+                return True
+            if len(self.waiting) >= self.queue_size and not self.evict(priority):
+                return False
+
+            waiter = {'rejected': False}
+            entry = (priority, next(self.arrivals), waiter)
+            heapq.heappush(self.waiting, entry)
+            try:
+                while True:
+                    if waiter['rejected'] or self.is_paused_past(deadline):
+                        return False
+                    if self.waiting[0] is entry and self.take():
+                        return True
+                    wait = self.get_wait()
+                    if deadline is not None:
+                        remaining = deadline - self.clock()
+                        if remaining <= 0:
+                            return False
+                        wait = min(wait, remaining) if wait is not None else remaining
+                    self.condition.wait(wait)
+            finally:
+                if not waiter['rejected']:
+                    self.waiting.remove(entry)
+                    heapq.heapify(self.waiting)
+                # The next call in line may be able to go through now.
+                self.condition.notify_all()
+
+    def pause(self, seconds):
+        """Holds every call for the given seconds, as cachet asked us to back off."""
+        with self.condition:
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+            # The bucket starts filling up again once the pause is over.
+            self.tokens = 0.0
+            self.updated_at = self.paused_until
+
+    def is_paused_past(self, deadline):
+        """Tells whether the calls are held past the deadline, so there's no point in waiting for it."""
+        return deadline is not None and self.paused_until > deadline
+
+    def take(self):
+        """Takes a token, if there's one available."""
+        now = self.clock()
+        if now < self.paused_until:
+            return False
+        if self.rate <= 0:
+            return True
+        self.tokens = min(self.tokens + (now - self.updated_at) * self.rate, float(self.burst))
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def get_wait(self):
+        """Returns how long until the next token is available."""
+        now = self.clock()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.rate <= 0:
+            return None
+        return max((1 - self.tokens) / self.rate, 0.001)
+
+    def evict(self, priority):
+        """Rejects the last call with the lowest priority, if its priority is lower than the given one."""
+        worst = max(self.waiting)
+        if worst[0] <= priority:
+            return False
+        self.waiting.remove(worst)
+        heapq.heapify(self.waiting)
+        worst[2]['rejected'] = True
+        self.condition.notify_all()
+        return True
+
+
+class RateLimiters(object):
+    """The rate limiter of each cachet API, shared by all the configurations of the process that report to it."""
+
+    def __init__(self):
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def get(self, api_url, rate=0, burst=1, queue_size=100):
+        """Returns the rate limiter of the cachet API, creating it with the given settings if it's the first time
+        it's used.
+        """
+        with self.lock:
+            if api_url not in self.limiters:
+                self.limiters[api_url] = RateLimiter(rate, burst, queue_size)
+            return self.limiters[api_url]
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Recording of the probe outcomes, so they can be replayed later without the endpoints. The recording is an append
+only file of JSON lines: one line whenever the monitored components change and one line per sweep.
+"""
+import json
+import logging
+import threading
+
+
+class Recorder(object):
+    """Appends the components and the outcome of every sweep to the recording file."""
+
+    def __init__(self, path):
+        self.logger = logging.getLogger('cachet_url_monitor.recorder.Recorder')
+        self.path = path
+        # The file is only opened once there's something to record.
+        self.file = None
+        self.lock = threading.Lock()
+
+    def record_components(self, components, statuses):
+        """Records the monitored components and their current statuses."""
+        self.write({'components': components, 'statuses': statuses})
+
+    def record_sweep(self, timestamp, statuses, messages, latencies):
+        """Records the statuses, messages and latencies, in seconds, of a sweep. The latency of the checks that got
+        no response is None.
+        """
+        self.write({'timestamp': round(timestamp, 3), 'statuses': statuses, 'messages': messages,
+                    'latencies': [None if latency is None else round(latency, 4) for latency in latencies]})
+
+    def write(self, entry):
+        line = json.dumps(entry, separators=(',', ':'))
+        with self.lock:
+            try:
+                if self.file is None:
+                    self.file = open(self.path, 'a')
+                self.file.write(line + '\n')
+                self.file.flush()
+            except IOError:
+                self.logger.exception('Failed to write to the recording %s' % (self.path,))
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def read_recording(path):
+    """Yields the entries of a recording, one by one."""
+    with open(path) as recording:
+        for line in recording:
+            if line.strip():
+                yield json.loads(line)
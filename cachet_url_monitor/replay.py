@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+"""
+Replays a recording through the same decision logic as the agent: the allowed fails, the status updates and the
+incidents. The calls go to a stand-in cachet and the sweeps run back to back, or at a given speed, so the settings
+can be tuned offline.
+"""
+import logging
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from configuration import Configuration
+from rate_limiter import PRIORITY_NORMAL
+from recorder import read_recording
+from scheduler import ACTIONS
+from scheduler import Agent
+
+
+class StandInResponse(object):
+    """Successful response of the stand-in cachet."""
+    status_code = 200
+    ok = True
+
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return {'data': self.data}
+
+
+class StandInCachet(object):
+    """Answers every cachet API call successfully, counting them by method and path."""
+
+    def __init__(self):
+        self.calls = Counter()
+        self.last_incident_id = 0
+        self.lock = threading.Lock()
+
+    def call(self, method, path, params=None):
+        with self.lock:
+            self.calls['%s %s' % (method.upper(), re.sub(r'/\d+', '/:id', path))] += 1
+            if method == 'post' and path == '/incidents':
+                self.last_incident_id += 1
+                return StandInResponse({'id': self.last_incident_id})
+        return StandInResponse(dict(params or {}))
+
+
+class ReplayConfiguration(Configuration):
+    """Configuration whose components and probe outcomes come from a recording and that reports to a stand-in
+    cachet. It doesn't discover anything, nor reads or writes the state file.
+    """
+
+    def __init__(self, config_file, cachet):
+        self.cachet = cachet
+        # The sweep evaluate() applies next.
+        self.sweep = None
+        super(ReplayConfiguration, self).__init__(config_file)
+        # We don't record the replay itself.
+        self.recorder = None
+        # Incidents are correlated using the recorded time.
+        self.correlator.clock = lambda: self.sweep['timestamp']
+
+    def update_urls(self):
+        """The components are replaced by the recording."""
+
+    def load_state(self):
+        return None
+
+    def save_state(self):
+        pass
+
+    def evaluate(self):
+        self.statuses[:] = self.sweep['statuses']
+        self.messages[:] = self.sweep['messages']
+        self.record_history(self.sweep['timestamp'], self.sweep['latencies'])
+
+    def call_cachet(self, method, path, params=None, priority=PRIORITY_NORMAL, wait=False):
+        return self.cachet.call(method, path, params)
+
+
+class ReplayReport(object):
+    def __init__(self, sweeps, recorded_seconds, elapsed_seconds, calls):
+        self.sweeps = sweeps
+        self.recorded_seconds = recorded_seconds
+        self.elapsed_seconds = elapsed_seconds
+        self.calls = calls
+
+    @property
+    def sweeps_per_second(self):
+        return self.sweeps / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    @property
+    def speedup(self):
+        """How many times faster than real time the recording was replayed."""
+        return self.recorded_seconds / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def __str__(self):
+        lines = ['Replayed %d sweeps (%.0f seconds) in %.3f seconds: %.1f sweeps per second, %.0fx real time' % (
+            self.sweeps, self.recorded_seconds, self.elapsed_seconds, self.sweeps_per_second, self.speedup)]
+        lines.append('Cachet API calls: %d' % (sum(self.calls.values()),))
+        for call, count in sorted(self.calls.items()):
+            lines.append('  %s: %d' % (call, count))
+        return '\n'.join(lines)
+
+
+class Replay(object):
+    """Feeds a recording through the agent, using the actions and settings of the configuration file. The sweeps
+    run back to back unless a speed is given, in which case the recorded interval between them is divided by it.
+    """
+
+    def __init__(self, config_file, recording, speed=0):
+        self.config_file = config_file
+        self.recording = recording
+        self.speed = speed
+
+    def run(self):
+        cachet = StandInCachet()
+        configuration = ReplayConfiguration(self.config_file, cachet)
+        agent = Agent(configuration, decorators=[ACTIONS[action]() for action in configuration.get_action()])
+
+        sweeps = 0
+        first_timestamp = last_timestamp = None
+        started = time.time()
+        for entry in read_recording(self.recording):
+            if 'components' in entry:
+                configuration.set_components(entry['components'], entry['statuses'])
+                continue
+            if first_timestamp is None:
+                first_timestamp = entry['timestamp']
+            elif self.speed:
+                time.sleep(max(entry['timestamp'] - last_timestamp, 0) / float(self.speed))
+            last_timestamp = entry['timestamp']
+            configuration.sweep = entry
+            agent.execute()
+            sweeps += 1
+        elapsed = time.time() - started
+
+        recorded = last_timestamp - first_timestamp if sweeps else 0
+        return ReplayReport(sweeps, recorded, elapsed, cachet.calls)
+
+
+if __name__ == "__main__":
+    FORMAT = "%(levelname)9s [%(asctime)-15s] %(name)s - %(message)s"
+    logging.basicConfig(format=FORMAT, level=logging.WARNING)
+
+    if len(sys.argv) < 3:
+        logging.fatal('Usage: replay.py <configuration file> <recording> [speed]')
+        sys.exit(1)
+
+    speed = float(sys.argv[3]) if len(sys.argv) > 3 else 0
+    print Replay(sys.argv[1], sys.argv[2], speed).run()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Memoization of the expectations that look into the response body. Most health pages don't change between checks,
+so we only run those expectations again when the body changed.
+"""
+import hashlib
+
+
+class NotModifiedResponse(object):
+    """Stands in for a 304 response, exposing the status code of the response it confirmed as unchanged."""
+
+    def __init__(self, response, status_code):
+        self.response = response
+        self.status_code = status_code
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+
+class CacheEntry(object):
+    __slots__ = ['digest', 'status_code', 'etag', 'last_modified', 'verdicts']
+
+    def __init__(self, digest, status_code, etag, last_modified, verdicts):
+        self.digest = digest
+        self.status_code = status_code
+        self.etag = etag
+        self.last_modified = last_modified
+        self.verdicts = verdicts
+
+
+class ResponseCache(object):
+    """Keeps, for each url, the digest of the last body and the (status, message) results of the body based
+    expectations for that body.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def conditional_headers(self, url, expectations=()):
+        """Returns the headers that let the server answer with 304 if the body didn't change. They are only sent
+        when there are cached results for all the given expectations, as the others need the body.
+        """
+        entry = self.entries.get(url)
+        headers = {}
+        if entry is not None and all(expectation in entry.verdicts for expectation in expectations):
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def lookup(self, url, response):
+        """Looks up the results of the body based expectations for this response.
+        :return: the response the expectations should be evaluated against, the digest of its body and the cached
+        results, which are None when the body changed.
+        """
+        entry = self.entries.get(url)
+        if response.status_code == 304 and entry is not None:
+            return NotModifiedResponse(response, entry.status_code), entry.digest, entry.verdicts
+        digest = hashlib.sha1(response.content).hexdigest()
+        if entry is not None and entry.digest == digest:
+            return response, digest, entry.verdicts
+        return response, digest, None
+
+    def store(self, url, response, digest, verdicts):
+        self.entries[url] = CacheEntry(digest, response.status_code, response.headers.get('ETag'),
+                                       response.headers.get('Last-Modified'), verdicts)
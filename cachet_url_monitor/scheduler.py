@@ -1,11 +1,20 @@
 #!/usr/bin/env python
 import logging
+import os
 import sys
+import threading
 import time
 
 import schedule
 
 from configuration import Configuration
+from discovery import DiscoveryCache
+from probe import Prober
+from profiling import Profiler
+from profiling import install_signal_handler
+from profiling import profiled
+from rate_limiter import RateLimiters
+from status_api import start_status_server
 
 
 class Agent(object):
@@ -13,13 +22,19 @@ class Agent(object):
     and updating the component.
     """
 
-    def __init__(self, configuration, decorators=None):
+    def __init__(self, configuration, decorators=None, profiler=None):
+        self.logger = logging.getLogger('cachet_url_monitor.scheduler.Agent')
         self.configuration = configuration
         if decorators is None:
             decorators = []
         self.decorators = decorators
+        self.profiler = profiler
         self.count = 0
+        self.execute_job = None
+        self.update_urls_job = None
+        self.update_urls_thread = None
 
+    @profiled('execute')
     def execute(self):
         """Will verify the API status and push the status and metrics to the
         cachet server.
@@ -31,13 +46,42 @@ class Agent(object):
         for decorator in self.decorators:
             decorator.execute(self.configuration)
     
+    @profiled('update_urls')
     def update_urls(self):
-        self.configuration.update_urls()
+        """Runs the discovery. If it fails, the last known components keep being checked until the next run."""
+        try:
+            self.configuration.update_urls()
+        except Exception:
+            self.logger.exception('Failed to update the monitoring urls, keeping the last known ones')
+
+    def start_update_urls(self):
+        """Runs the discovery in the background, so the checks keep running while it waits for cachet. A discovery
+        isn't started while the previous one is still running.
+        """
+        if self.update_urls_thread is not None and self.update_urls_thread.is_alive():
+            self.logger.warning('The previous discovery is still running, skipping this one')
+            return
+        self.update_urls_thread = threading.Thread(target=self.update_urls, name='update-urls')
+        self.update_urls_thread.daemon = True
+        self.update_urls_thread.start()
 
     def start(self):
         """Sets up the schedule based on the configuration file."""
-        schedule.every(self.configuration.data['frequency']).seconds.do(self.execute)
-        schedule.every(self.configuration.data['update_urls_frequency']).seconds.do(self.update_urls)
+        self.execute_job = schedule.every(self.configuration.data['frequency']).seconds.do(self.execute)
+        self.update_urls_job = schedule.every(self.configuration.data['update_urls_frequency']).seconds.do(
+            self.start_update_urls)
+        if self.configuration.fast_start:
+            # We started from the last known state, so we can start checking right away.
+            self.execute()
+
+    def reschedule(self, frequency=None, update_urls_frequency=None):
+        """Reschedules the jobs whose frequency is given, the other jobs are left untouched."""
+        if frequency is not None:
+            schedule.cancel_job(self.execute_job)
+            self.execute_job = schedule.every(frequency).seconds.do(self.execute)
+        if update_urls_frequency is not None:
+            schedule.cancel_job(self.update_urls_job)
+            self.update_urls_job = schedule.every(update_urls_frequency).seconds.do(self.start_update_urls)
 
 
 class Decorator(object):
@@ -55,35 +99,116 @@ class CreateIncidentDecorator(Decorator):
         configuration.push_incident()
 
 
+ACTIONS = {
+    'CREATE_INCIDENT': CreateIncidentDecorator,
+    'UPDATE_STATUS': UpdateStatusDecorator,
+}
+
+
 class Scheduler(object):
-    def __init__(self, config_file):
+    def __init__(self, config_file, prober=None, discovery_cache=None, rate_limiters=None):
         self.logger = logging.getLogger('cachet_url_monitor.scheduler.Scheduler')
-        self.configuration = Configuration(config_file)
+        self.config_file = config_file
+        # We watch the configuration file, so its changes are applied without restarting.
+        self.config_mtime = os.path.getmtime(config_file)
+        self.configuration = Configuration(config_file, prober=prober, discovery_cache=discovery_cache,
+                                           rate_limiters=rate_limiters)
+        # The agent's jobs can be profiled on demand, see profiling.py.
+        self.profiler = Profiler(os.path.splitext(os.path.basename(config_file))[0],
+                                 self.configuration.profile_directory, self.configuration.profile_runs)
+        if self.configuration.profiling:
+            self.profiler.arm()
         self.agent = self.get_agent()
+        self.status_server = None
 
         self.stop = False
 
     def get_agent(self):
-        action_names = {
-            'CREATE_INCIDENT': CreateIncidentDecorator,
-            'UPDATE_STATUS': UpdateStatusDecorator,
-        }
+        return Agent(self.configuration, decorators=self.get_decorators(), profiler=self.profiler)
+
+    def get_decorators(self):
         actions = []
         for action in self.configuration.get_action():
             self.logger.info('Registering action %s' % (action))
-            actions.append(action_names[action]())
-        return Agent(self.configuration, decorators=actions)
+            actions.append(ACTIONS[action]())
+        return actions
+
+    def reload(self):
+        """Applies the changes of the configuration file, if it was modified since it was last read. Only the jobs
+        whose frequency changed are rescheduled. An invalid configuration is ignored and the current one is kept.
+        """
+        try:
+            config_mtime = os.path.getmtime(self.config_file)
+        except OSError:
+            # The file is probably being replaced, we'll check it again on the next run.
+            return
+        if config_mtime == self.config_mtime:
+            return
+        self.config_mtime = config_mtime
+
+        old_data = self.configuration.data
+        try:
+            self.configuration.reload()
+        except Exception:
+            self.logger.exception('Failed to reload %s, keeping the current configuration' % (self.config_file,))
+            return
+        data = self.configuration.data
+
+        if data['cachet'].get('action') != old_data['cachet'].get('action'):
+            self.agent.decorators = self.get_decorators()
+        self.agent.reschedule(
+            data['frequency'] if data['frequency'] != old_data['frequency'] else None,
+            data['update_urls_frequency'] if data['update_urls_frequency'] != old_data['update_urls_frequency'] else None)
+        self.profiler.directory = self.configuration.profile_directory or self.profiler.directory
+        self.profiler.runs = self.configuration.profile_runs
+        if self.configuration.profiling and data.get('profiling') != old_data.get('profiling'):
+            self.profiler.arm()
+        self.logger.info('Reloaded configuration from %s' % (self.config_file,))
 
     def start(self):
+        self.status_server = start_status_server([self.configuration])
         self.agent.start()
         self.logger.info('Starting monitor agent...')
         while not self.stop:
             schedule.run_pending()
+            self.reload()
             # time.sleep(self.configuration.data['frequency'])
             # we want to run two jobs, so we don't set sleep here.
             time.sleep(1)
 
 
+class Host(object):
+    """Runs the configurations of several files in the same process. They share the schedule, the connections
+    used by the checks, the discovery requests and the rate limiter of each cachet, while each one keeps its own
+    expectations, token and actions. Checks of the same URL by different configurations are coalesced into a single
+    request.
+    """
+
+    def __init__(self, config_files):
+        self.logger = logging.getLogger('cachet_url_monitor.scheduler.Host')
+        self.prober = Prober(pool_size=int(os.environ.get('PROBE_POOL_SIZE') or 10),
+                             coalesce_window=float(os.environ.get('PROBE_COALESCE_WINDOW') or 5))
+        self.discovery_cache = DiscoveryCache(ttl=float(os.environ.get('DISCOVERY_CACHE_TTL') or 60))
+        self.rate_limiters = RateLimiters()
+        self.schedulers = [Scheduler(config_file, prober=self.prober, discovery_cache=self.discovery_cache,
+                                     rate_limiters=self.rate_limiters)
+                           for config_file in config_files]
+        self.status_server = None
+
+        self.stop = False
+
+    def start(self):
+        self.status_server = start_status_server([scheduler.configuration for scheduler in self.schedulers])
+        for scheduler in self.schedulers:
+            scheduler.agent.start()
+        self.logger.info('Starting monitor agents for %d configurations...' % (len(self.schedulers),))
+        while not self.stop:
+            schedule.run_pending()
+            for scheduler in self.schedulers:
+                scheduler.reload()
+            time.sleep(1)
+
+
 if __name__ == "__main__":
     FORMAT = "%(levelname)9s [%(asctime)-15s] %(name)s - %(message)s"
     logging.basicConfig(format=FORMAT, level=logging.INFO)
@@ -94,5 +219,12 @@ if __name__ == "__main__":
         logging.fatal('Missing configuration file argument')
         sys.exit(1)
 
-    scheduler = Scheduler(sys.argv[1])
+    if len(sys.argv) > 2:
+        scheduler = Host(sys.argv[1:])
+        profilers = [each.profiler for each in scheduler.schedulers]
+    else:
+        scheduler = Scheduler(sys.argv[1])
+        profilers = [scheduler.profiler]
+    # Sending SIGUSR1 to the process profiles the next runs of its jobs.
+    install_signal_handler(profilers)
     scheduler.start()
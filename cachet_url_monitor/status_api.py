@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+"""
+Local, read only, HTTP API serving the status of the monitored components straight from memory, so dashboards
+don't need to poll cachet and always see the result of the last check.
+"""
+import json
+import logging
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler
+from BaseHTTPServer import HTTPServer
+from SocketServer import ThreadingMixIn
+from urllib import urlencode
+from urlparse import parse_qs
+from urlparse import urlparse
+
+from discovery import parse_component_name
+
+# How many components are returned per page by default, the same as cachet.
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 1000
+
+
+class StatusSnapshot(object):
+    """The status of the components at a given time. A new snapshot is taken after each check instead of changing
+    the current one, so the API reads it without holding any lock.
+    """
+
+    def __init__(self, components, taken_at=None):
+        self.components = tuple(components)
+        self.taken_at = taken_at if taken_at is not None else time.time()
+
+    @staticmethod
+    def component(component_id, name, status, version, message, checked_at):
+        service, center, env = parse_component_name(name) or (name, None, None)
+        return {
+            'id': component_id,
+            'name': name,
+            'service': service,
+            'center': center,
+            'env': env,
+            'status': status,
+            'version': version,
+            'message': message,
+            'checked_at': checked_at if checked_at != -1 else None,
+        }
+
+    def select(self, centers=None, envs=None, statuses=None):
+        """Returns the components in any of the given centers, envs and statuses."""
+        return [component for component in self.components
+                if (not centers or component['center'] in centers) and
+                (not envs or component['env'] in envs) and
+                (not statuses or component['status'] in statuses)]
+
+
+class StatusRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        try:
+            if url.path == '/components':
+                self.send_json(200, self.server.get_components(query))
+            elif url.path == '/stats':
+                self.send_json(200, {'data': [configuration.get_stats()
+                                              for configuration in self.server.configurations]})
+            else:
+                self.send_json(404, {'error': 'Not found: %s' % (url.path,)})
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+
+    def send_json(self, code, data):
+        body = json.dumps(data)
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        self.server.logger.debug(format % args)
+
+
+class StatusServer(ThreadingMixIn, HTTPServer):
+    """Serves the last snapshot of each configuration:
+    - /components lists the components, paginated like cachet's API with the page and per_page parameters and
+      filtered by the center, env and status parameters, which can be repeated.
+    - /stats lists the stats of each configuration.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, configurations):
+        self.logger = logging.getLogger('cachet_url_monitor.status_api.StatusServer')
+        HTTPServer.__init__(self, address, StatusRequestHandler)
+        self.configurations = configurations
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name='status-api')
+        thread.daemon = True
+        thread.start()
+        self.logger.info('Serving the status API on %s:%d' % self.server_address)
+
+    def get_components(self, query):
+        page = get_int(query, 'page', 1)
+        per_page = min(get_int(query, 'per_page', DEFAULT_PER_PAGE), MAX_PER_PAGE)
+        if page < 1 or per_page < 1:
+            raise ValueError('page and per_page must be positive')
+        statuses = [int(status) for status in query.get('status', [])]
+
+        components = []
+        for configuration in self.configurations:
+            components.extend(configuration.snapshot.select(query.get('center'), query.get('env'), statuses))
+
+        total_pages = max((len(components) + per_page - 1) // per_page, 1)
+        data = components[(page - 1) * per_page:page * per_page]
+        return {
+            'meta': {
+                'pagination': {
+                    'total': len(components),
+                    'count': len(data),
+                    'per_page': per_page,
+                    'current_page': page,
+                    'total_pages': total_pages,
+                    'links': {
+                        'next_page': get_page_link(query, page + 1) if page < total_pages else None,
+                        'previous_page': get_page_link(query, page - 1) if page > 1 else None,
+                    },
+                },
+            },
+            'data': data,
+        }
+
+
+def get_int(query, name, default):
+    try:
+        return int(query[name][0]) if name in query else default
+    except ValueError:
+        raise ValueError('Invalid %s: %s' % (name, query[name][0]))
+
+
+def get_page_link(query, page):
+    query = dict(query, page=[page])
+    return '/components?%s' % (urlencode(sorted(query.items()), doseq=True),)
+
+
+def start_status_server(configurations):
+    """Starts the status API on the address of the first configuration that sets one.
+    :return: the server or None if no configuration sets it.
+    """
+    for configuration in configurations:
+        if configuration.status_api_port:
+            server = StatusServer((configuration.status_api_host, configuration.status_api_port), configurations)
+            server.start()
+            return server
+    return None
@@ -1,5 +1,5 @@
 #!/usr/bin/env python
-from distutils.core import setup
+from setuptools import setup
 
 setup(name='cachet-url-monitor',
       version='0.4',
@@ -13,5 +13,9 @@ setup(name='cachet-url-monitor',
           'requests',
           'yaml',
           'schedule',
-          ]
+          ],
+      # Evaluates the expectations of all the URLs at once, see the README.
+      extras_require={
+          'numpy': ['numpy'],
+          }
      )
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+import unittest
+
+from cachet_url_monitor.circuit_breaker import CircuitBreaker
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000
+        self.breaker = CircuitBreaker(2, 30, clock=lambda: self.now)
+
+    def test_init(self):
+        assert self.breaker.allow()
+        assert not self.breaker.is_open
+
+    def test_failure_below_threshold(self):
+        self.breaker.failure()
+
+        assert self.breaker.allow()
+
+    def test_failure_opens_circuit(self):
+        self.breaker.failure()
+        self.breaker.failure()
+
+        assert self.breaker.is_open
+        assert not self.breaker.allow()
+
+    def test_success_resets_failures(self):
+        self.breaker.failure()
+        self.breaker.success()
+        self.breaker.failure()
+
+        assert self.breaker.allow()
+
+    def test_trial_call_after_reset_timeout(self):
+        self.breaker.failure()
+        self.breaker.failure()
+        self.now += 30
+
+        assert self.breaker.allow()
+        # Only one trial call goes through.
+        assert not self.breaker.allow()
+
+        self.breaker.success()
+        assert self.breaker.allow()
+
+    def test_failed_trial_call_opens_circuit(self):
+        self.breaker.failure()
+        self.breaker.failure()
+        self.now += 30
+        self.breaker.allow()
+        self.breaker.failure()
+
+        assert not self.breaker.allow()
+        self.now += 30
+        assert self.breaker.allow()
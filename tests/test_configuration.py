@@ -1,17 +1,60 @@
 #!/usr/bin/env python
+import json
+import os
+import shutil
 import sys
+import tempfile
+import threading
+import time
 import unittest
 
 import mock
+import pytest
 from requests import ConnectionError, HTTPError, Timeout
 
 import cachet_url_monitor.status
 
 sys.modules['requests'] = mock.Mock()
 sys.modules['logging'] = mock.Mock()
+import cachet_url_monitor.configuration
 from cachet_url_monitor.configuration import Configuration
+from cachet_url_monitor.configuration import ConfigurationValidationError
+from cachet_url_monitor.rate_limiter import PRIORITY_HIGH
+from cachet_url_monitor.rate_limiter import RateLimiters
 from test.test_support import EnvironmentVarGuard
 
+CONFIGURATION = """
+endpoint:
+  method: GET
+  timeout: 1
+  concurrency: 4
+  expectation:
+    - type: HTTP_STATUS
+      status_range: 200-300
+cachet:
+  api_url: http://localhost/api/v1
+  token: my_token
+  public_incidents: true
+frequency: 30
+update_urls_frequency: 3600
+"""
+
+
+def get_components(component_ids):
+    return {
+        'component_ids': component_ids,
+        'component_names': ['svc%d-qdc-prd1' % (component_id,) for component_id in component_ids],
+        'endpoint_urls': ['http://host%d/health' % (component_id,) for component_id in component_ids],
+        'endpoint_version_urls': ['' for component_id in component_ids],
+    }
+
+
+def get_response(url):
+    response = mock.Mock()
+    response.status_code = 200
+    response.elapsed.total_seconds.return_value = 0.1
+    return response
+
 
 class ConfigurationTest(unittest.TestCase):
     def setUp(self):
@@ -57,7 +100,7 @@ class ConfigurationTest(unittest.TestCase):
             response.text = '<body>'
             return response
 
-        sys.modules['requests'].request = request
+        self.configuration.prober.request = request
         self.configuration.evaluate()
 
         self.assertEquals(self.configuration.status, cachet_url_monitor.status.COMPONENT_STATUS_OPERATIONAL,
@@ -76,7 +119,7 @@ class ConfigurationTest(unittest.TestCase):
             response.text = '<body>'
             return response
 
-        sys.modules['requests'].request = request
+        self.configuration.prober.request = request
         self.configuration.evaluate()
 
         self.assertEquals(self.configuration.status, cachet_url_monitor.status.COMPONENT_STATUS_PARTIAL_OUTAGE,
@@ -90,7 +133,7 @@ class ConfigurationTest(unittest.TestCase):
 
             raise Timeout()
 
-        sys.modules['requests'].request = request
+        self.configuration.prober.request = request
         self.configuration.evaluate()
 
         self.assertEquals(self.configuration.status, cachet_url_monitor.status.COMPONENT_STATUS_PERFORMANCE_ISSUES,
@@ -105,7 +148,7 @@ class ConfigurationTest(unittest.TestCase):
 
             raise ConnectionError()
 
-        sys.modules['requests'].request = request
+        self.configuration.prober.request = request
         self.configuration.evaluate()
 
         self.assertEquals(self.configuration.status, cachet_url_monitor.status.COMPONENT_STATUS_PARTIAL_OUTAGE,
@@ -120,7 +163,7 @@ class ConfigurationTest(unittest.TestCase):
 
             raise HTTPError()
 
-        sys.modules['requests'].request = request
+        self.configuration.prober.request = request
         self.configuration.evaluate()
 
         self.assertEquals(self.configuration.status, cachet_url_monitor.status.COMPONENT_STATUS_PARTIAL_OUTAGE,
@@ -128,7 +171,7 @@ class ConfigurationTest(unittest.TestCase):
         self.mock_logger.exception.assert_called_with('Unexpected HTTP response')
 
     def test_push_status(self):
-        def put(url, params=None, headers=None):
+        def put(url, params=None, headers=None, timeout=None):
             self.assertEquals(url, 'https://demo.cachethq.io/api/v1/components/1', 'Incorrect cachet API URL')
             self.assertDictEqual(params, {'id': 1, 'status': 1}, 'Incorrect component update parameters')
             self.assertDictEqual(headers, {'X-Cachet-Token': 'token2'}, 'Incorrect component update parameters')
@@ -143,7 +186,7 @@ class ConfigurationTest(unittest.TestCase):
         self.configuration.push_status()
 
     def test_push_status_with_failure(self):
-        def put(url, params=None, headers=None):
+        def put(url, params=None, headers=None, timeout=None):
             self.assertEquals(url, 'https://demo.cachethq.io/api/v1/components/1', 'Incorrect cachet API URL')
             self.assertDictEqual(params, {'id': 1, 'status': 1}, 'Incorrect component update parameters')
             self.assertDictEqual(headers, {'X-Cachet-Token': 'token2'}, 'Incorrect component update parameters')
@@ -156,3 +199,285 @@ class ConfigurationTest(unittest.TestCase):
         self.assertEquals(self.configuration.status, cachet_url_monitor.status.COMPONENT_STATUS_OPERATIONAL,
                           'Incorrect component update parameters')
         self.configuration.push_status()
+
+
+class ConfigurationFileTest(unittest.TestCase):
+    """Runs the configuration from its own file, without discovering the components."""
+    configuration_data = CONFIGURATION
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.directory, 'config.yml')
+        with open(self.config_file, 'w') as config_file:
+            config_file.write(self.configuration_data)
+
+        cachet_url_monitor.configuration.requests.Timeout = Timeout
+        cachet_url_monitor.configuration.requests.ConnectionError = ConnectionError
+        cachet_url_monitor.configuration.requests.HTTPError = HTTPError
+        self.prober = mock.Mock()
+        self.configuration = self.create_configuration()
+        self.configuration.set_components(get_components([10, 11, 12]), [1, 1, 1])
+
+    def create_configuration(self, rate_limiters=None):
+        with mock.patch.object(Configuration, 'update_urls'):
+            return Configuration(self.config_file, prober=self.prober, rate_limiters=rate_limiters)
+
+    def tearDown(self):
+        if self.configuration.pool is not None:
+            self.configuration.pool.terminate()
+        shutil.rmtree(self.directory)
+
+
+class ConcurrentEvaluateTest(ConfigurationFileTest):
+    def test_evaluate(self):
+        def request(method, url, timeout=None):
+            if url == 'http://host11/health':
+                raise Timeout()
+            return get_response(url)
+
+        self.prober.request = request
+        self.configuration.evaluate()
+
+        assert self.configuration.statuses == [1, 2, 1]
+        assert self.configuration.messages == ['', 'Request timed out', '']
+        assert self.configuration.probing == set()
+
+    def test_evaluate_past_frequency(self):
+        released = threading.Event()
+        calls = []
+
+        def request(method, url, timeout=None):
+            calls.append(url)
+            if url == 'http://host11/health':
+                released.wait(5)
+                raise Timeout()
+            return get_response(url)
+
+        self.prober.request = request
+        self.configuration.data['frequency'] = 0.2
+        self.configuration.evaluate()
+
+        # The slow check is still running, its component keeps its last status.
+        assert self.configuration.statuses == [1, 1, 1]
+        assert self.configuration.probing == {11}
+
+        # It isn't checked again while it's running.
+        self.configuration.evaluate()
+        assert calls.count('http://host11/health') == 1
+
+        # Once the components changed, the slow check must not change the status of whatever is at its index.
+        self.configuration.set_components(get_components([11, 13]), [1, 1])
+        released.set()
+        deadline = time.time() + 5
+        while self.configuration.probing and time.time() < deadline:
+            time.sleep(0.01)
+        assert self.configuration.statuses == [1, 1]
+        assert self.configuration.messages == ['', '']
+
+        self.configuration.evaluate()
+        assert calls.count('http://host11/health') == 2
+        assert self.configuration.statuses == [2, 1]
+
+
+class ProbeUrlTest(ConfigurationFileTest):
+    def test_probe_url_without_conditional_headers(self):
+        self.configuration.body_cache = True
+        self.configuration.conditional_requests = True
+
+        self.configuration.probe_url('http://host10/health', '', self.configuration.endpoint_breakers[0])
+
+        # Without headers, the request can be coalesced with the ones of other configurations.
+        self.prober.request.assert_called_once_with('GET', 'http://host10/health', timeout=1)
+
+class StateTest(ConfigurationFileTest):
+    def setUp(self):
+        super(StateTest, self).setUp()
+        self.state_file = os.path.join(self.directory, 'state.json')
+        self.configuration.state_file = self.state_file
+
+    def test_load_state_without_file(self):
+        assert self.configuration.load_state() is None
+
+    def test_load_state_with_corrupt_file(self):
+        with open(self.state_file, 'w') as state_file:
+            state_file.write('{"components": ')
+
+        assert self.configuration.load_state() is None
+
+    def test_save_state(self):
+        self.configuration.statuses[1] = 3
+        self.configuration.incident_ids[1] = 7
+
+        self.configuration.save_state()
+
+        # The temporary file was renamed to the state file.
+        assert sorted(os.listdir(self.directory)) == ['config.yml', 'state.json']
+        state = self.configuration.load_state()
+        assert state['components'] == get_components([10, 11, 12])
+        assert state['statuses'] == [1, 3, 1]
+        assert state['incident_ids'] == [-1, 7, -1]
+
+    def test_fast_start(self):
+        with open(self.config_file, 'a') as config_file:
+            config_file.write('state_file: %s\n' % (self.state_file,))
+        with open(self.state_file, 'w') as state_file:
+            json.dump({'components': get_components([10, 11, 12]), 'statuses': [3, 3, 1],
+                       'incident_ids': [7, 7, -1]}, state_file)
+
+        with mock.patch.object(Configuration, 'bootstrap'):
+            configuration = self.create_configuration()
+
+        assert configuration.fast_start
+        assert configuration.statuses == [3, 3, 1]
+        assert configuration.incident_ids == [7, 7, -1]
+        # The grouped incident stays open until both components recovered.
+        assert not configuration.correlator.resolve(7, 10)
+        assert configuration.correlator.resolve(7, 11)
+
+    def test_set_components_keeps_open_incidents(self):
+        self.configuration.incident_ids[1] = 7
+
+        self.configuration.set_components(get_components([13, 11]), [1, 3])
+
+        assert self.configuration.incident_ids == [-1, 7]
+
+    def test_set_components_closes_incidents_of_dropped_components(self):
+        self.configuration.call_cachet = mock.Mock()
+        self.configuration.set_components(get_components([10, 11, 12]), [3, 3, 1], [7, 7, -1])
+
+        self.configuration.set_components(get_components([11, 12]), [3, 1])
+        assert self.configuration.incident_ids == [7, -1]
+        self.configuration.call_cachet.assert_not_called()
+
+        self.configuration.set_components(get_components([12]), [1])
+        self.configuration.call_cachet.assert_called_once_with(
+            'put', '/incidents/7', {'status': 4, 'visible': 1, 'notify': True}, PRIORITY_HIGH)
+
+
+class ReloadTest(ConfigurationFileTest):
+    def write_configuration(self, data):
+        with open(self.config_file, 'w') as config_file:
+            config_file.write(data)
+        self.configuration.logger = mock.Mock()
+
+    def test_reload_reuses_unchanged_expectations(self):
+        expectation = self.configuration.expectations[0]
+        self.write_configuration(CONFIGURATION.replace('      status_range: 200-300\n', '''      status_range: 200-300
+    - type: LATENCY
+      threshold: 1
+'''))
+
+        self.configuration.reload()
+
+        assert len(self.configuration.expectations) == 2
+        assert self.configuration.expectations[0] is expectation
+
+    def test_reload_with_invalid_configuration(self):
+        expectations = self.configuration.expectations
+        headers = self.configuration.headers
+        self.configuration.statuses[1] = 3
+        self.configuration.incident_ids[1] = 7
+        self.write_configuration(CONFIGURATION.replace('  token: my_token\n', '').replace(
+            '\nfrequency: 30\n', '\nfrequency: 10\n'))
+
+        with pytest.raises(ConfigurationValidationError):
+            self.configuration.reload()
+
+        assert self.configuration.data['frequency'] == 30
+        assert self.configuration.headers is headers
+        assert self.configuration.expectations is expectations
+        assert self.configuration.statuses == [1, 3, 1]
+        assert self.configuration.incident_ids == [-1, 7, -1]
+
+    def test_reload_updates_breakers_and_limiter(self):
+        self.write_configuration(CONFIGURATION.replace('  timeout: 1\n', '''  timeout: 1
+  allowed_fails: 2
+  probe_interval: 10
+''').replace('  public_incidents: true\n', '''  public_incidents: true
+  failure_threshold: 5
+  retry_interval: 60
+  rate_limit: 2
+  burst: 4
+  queue_size: 10
+'''))
+
+        self.configuration.reload()
+
+        assert self.configuration.cachet_breaker.failure_threshold == 5
+        assert self.configuration.cachet_breaker.reset_timeout == 60
+        assert self.configuration.cachet_limiter.rate == 2
+        assert self.configuration.cachet_limiter.burst == 4
+        assert self.configuration.cachet_limiter.queue_size == 10
+        for breaker in self.configuration.endpoint_breakers:
+            assert breaker.failure_threshold == 3
+            assert breaker.reset_timeout == 10
+
+    def test_reload_frequency(self):
+        self.write_configuration(CONFIGURATION.replace('\nfrequency: 30\n', '\nfrequency: 10\n'))
+
+        self.configuration.reload()
+
+        assert self.configuration.data['frequency'] == 10
+        self.configuration.logger.warning.assert_called_with(
+            'Changing frequency requires a restart to resize the history')
+
+    def test_reload_switches_rate_limiter(self):
+        rate_limiters = RateLimiters()
+        first = self.create_configuration(rate_limiters=rate_limiters)
+        first.set_components(get_components([10]), [1])
+        second = self.create_configuration(rate_limiters=rate_limiters)
+        assert first.cachet_limiter is second.cachet_limiter
+        self.write_configuration(CONFIGURATION.replace('http://localhost/api/v1', 'http://cachet/api/v1'))
+
+        first.reload()
+
+        assert first.cachet_limiter is rate_limiters.get('http://cachet/api/v1')
+        assert second.cachet_limiter is rate_limiters.get('http://localhost/api/v1')
+        assert first.cachet_limiter is not second.cachet_limiter
+
+
+class RequestCachetTest(ConfigurationFileTest):
+    def get_response(self, status_code):
+        response = mock.Mock()
+        response.status_code = status_code
+        response.headers = {'Retry-After': '0'} if status_code == 429 else {}
+        return response
+
+    def test_request_cachet_throttled(self):
+        responses = [self.get_response(429), self.get_response(429), self.get_response(200)]
+        with mock.patch.object(cachet_url_monitor.configuration.requests, 'get', side_effect=responses) as get:
+            assert self.configuration.call_cachet('get', '/components/10') is None
+
+        assert get.call_count == 2
+
+    def test_request_cachet_waits_while_throttled(self):
+        responses = [self.get_response(429), self.get_response(429), self.get_response(200)]
+        with mock.patch.object(cachet_url_monitor.configuration.requests, 'get', side_effect=responses) as get:
+            assert self.configuration.call_cachet('get', '/components/10', wait=True) is responses[2]
+
+        assert get.call_count == 3
+
+    def test_request_cachet_waits_until_next_discovery(self):
+        self.configuration.data['update_urls_frequency'] = 1
+        response = mock.Mock()
+        response.status_code = 429
+        response.headers = {'Retry-After': '60'}
+
+        start = time.time()
+        with mock.patch.object(cachet_url_monitor.configuration.requests, 'get', return_value=response) as get:
+            assert self.configuration.call_cachet('get', '/components/10', wait=True) is None
+
+        # Cachet asked us to wait past the next discovery, so we gave up right away.
+        assert get.call_count == 1
+        assert time.time() - start < 0.5
+
+
+class PushStatusTest(ConfigurationFileTest):
+    def test_push_status_stops_after_drop(self):
+        self.configuration.call_cachet = mock.Mock(return_value=None)
+
+        self.configuration.push_status()
+
+        # Once an update is dropped, the others wait for the next check instead of cachet.
+        self.configuration.call_cachet.assert_called_once()
+        assert self.configuration.pending_updates == {10, 11, 12}
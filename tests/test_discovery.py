@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+import unittest
+
+import mock
+
+from cachet_url_monitor.discovery import DiscoveryCache
+from cachet_url_monitor.discovery import parse_component_name
+
+
+class ParseComponentNameTest(unittest.TestCase):
+    def test_parse_component_name(self):
+        assert parse_component_name('svc-qdc-prd1') == ('svc', 'qdc', 'prd1')
+
+    def test_parse_component_name_without_convention(self):
+        assert parse_component_name('svc') is None
+        assert parse_component_name('my-svc-qdc-prd1') is None
+
+
+class DiscoveryCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000
+        self.cache = DiscoveryCache(ttl=60, clock=lambda: self.now)
+        self.fetch = mock.Mock(return_value='body')
+
+    def test_get(self):
+        assert self.cache.get('http://walker/qdc.yaml', self.fetch) == 'body'
+        assert self.cache.get('http://walker/qdc.yaml', self.fetch) == 'body'
+
+        self.fetch.assert_called_once_with('http://walker/qdc.yaml')
+
+    def test_get_expired(self):
+        self.cache.get('http://walker/qdc.yaml', self.fetch)
+        self.now += 60
+        self.cache.get('http://walker/qdc.yaml', self.fetch)
+
+        assert self.fetch.call_count == 2
+
+    def test_get_without_ttl(self):
+        cache = DiscoveryCache()
+        cache.get('http://walker/qdc.yaml', self.fetch)
+        cache.get('http://walker/qdc.yaml', self.fetch)
+
+        assert self.fetch.call_count == 2
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+import socket
+import threading
+import unittest
+
+from cachet_url_monitor.dns_cache import DNSCache
+
+
+class DNSCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        self.lookups = []
+        self.failing = False
+        self.cache = DNSCache(self.resolver, ttl=60, negative_ttl=5, clock=lambda: self.now)
+
+    def resolver(self, host, port):
+        self.lookups.append(host)
+        if self.failing:
+            raise socket.gaierror(-2, 'Name or service not known')
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', port))]
+
+    def test_resolve(self):
+        first = self.cache.resolve('localhost', 80)
+        second = self.cache.resolve('localhost', 80)
+
+        assert first is second
+        assert self.lookups == ['localhost']
+        assert self.cache.stats() == {'hits': 1, 'misses': 1, 'negative_hits': 0, 'refreshes': 0, 'hosts': 1}
+
+    def test_resolve_expired(self):
+        self.cache.resolve('localhost', 80)
+        self.now = 60
+
+        self.cache.resolve('localhost', 80)
+
+        assert self.lookups == ['localhost', 'localhost']
+
+    def test_resolve_failure(self):
+        self.failing = True
+
+        for i in range(2):
+            with self.assertRaises(socket.gaierror):
+                self.cache.resolve('localhost', 80)
+
+        assert self.lookups == ['localhost']
+        assert self.cache.stats()['negative_hits'] == 1
+
+        self.now = 5
+        self.failing = False
+        self.cache.resolve('localhost', 80)
+
+        assert self.lookups == ['localhost', 'localhost']
+
+    def test_resolve_refreshes_ahead(self):
+        self.cache.resolve('localhost', 80)
+        self.now = 50
+
+        self.cache.resolve('localhost', 80)
+        for thread in threading.enumerate():
+            if thread.name == 'dns-refresh':
+                thread.join()
+
+        assert self.lookups == ['localhost', 'localhost']
+        assert self.cache.entries[('localhost', 80)].resolved_at == 50
+        assert self.cache.stats()['refreshes'] == 1
+
+    def test_resolve_disabled(self):
+        self.cache.ttl = 0
+
+        self.cache.resolve('localhost', 80)
+        self.cache.resolve('localhost', 80)
+
+        assert self.lookups == ['localhost', 'localhost']
@@ -5,8 +5,15 @@ import unittest
 import mock
 import pytest
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import cachet_url_monitor.configuration
 from cachet_url_monitor.configuration import HttpStatus, Regex
 from cachet_url_monitor.configuration import Latency
+from cachet_url_monitor.configuration import Sweep
 
 
 class LatencyTest(unittest.TestCase):
@@ -51,6 +58,92 @@ class LatencyTest(unittest.TestCase):
                                                          'threshold: 0.1000 seconds')
 
 
+class LatencyPhaseTest(unittest.TestCase):
+    def setUp(self):
+        self.expectation = Latency({'type': 'LATENCY', 'threshold': 1, 'phase': 'ttfb'})
+
+    def test_init(self):
+        assert self.expectation.phase == 'ttfb'
+
+    def test_init_with_invalid_phase(self):
+        with pytest.raises(ValueError):
+            Latency({'type': 'LATENCY', 'threshold': 1, 'phase': 'foo'})
+
+    def test_get_status_healthy(self):
+        request = mock.Mock()
+        request.timings.ttfb = 0.1
+
+        assert self.expectation.get_status(request) == 1
+
+    def test_get_status_unhealthy(self):
+        request = mock.Mock()
+        request.timings.ttfb = 2
+
+        assert self.expectation.get_status(request) == 2
+
+    def test_get_message(self):
+        request = mock.Mock()
+        request.timings.ttfb = 2
+
+        assert self.expectation.get_message(request) == ('Latency above '
+                                                         'threshold (ttfb): 2.0000 seconds')
+
+
+def get_response(status_code, latency):
+    response = mock.Mock()
+    response.status_code = status_code
+    response.elapsed.total_seconds.return_value = latency
+    return response
+
+
+class SweepTest(unittest.TestCase):
+    """Evaluates the sweeps with plain lists, NumpySweepTest runs the same tests with numpy."""
+    numpy = None
+
+    def setUp(self):
+        patcher = mock.patch.object(cachet_url_monitor.configuration, 'numpy', self.numpy)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.sweep = Sweep([get_response(200, 0.1), get_response(400, 2), get_response(200, 1.5)])
+
+    def test_column(self):
+        request = mock.Mock()
+        request.status_code = 200
+        sweep = Sweep([request, request])
+
+        assert list(sweep.column('status_code', lambda response: response.status_code)) == [200, 200]
+        assert sweep.column('status_code', None) is sweep.columns['status_code']
+
+    def test_worst(self):
+        statuses, expectations = Sweep([None, None, None]).worst([[1, 3, 1], [2, 3, 1]])
+
+        assert list(statuses) == [2, 3, 1]
+        assert list(expectations)[:2] == [1, 0]
+
+    def test_worst_without_expectations(self):
+        statuses, expectations = Sweep([None]).worst([])
+
+        assert list(statuses) == [1]
+
+    def test_http_status_get_statuses(self):
+        expectation = HttpStatus({'type': 'HTTP_STATUS', 'status_range': '200-300'})
+
+        assert list(expectation.get_statuses(self.sweep)) == [1, 3, 1]
+
+    def test_latency_get_statuses(self):
+        expectation = Latency({'type': 'LATENCY', 'threshold': 1})
+
+        assert list(expectation.get_statuses(self.sweep)) == [1, 2, 2]
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class NumpySweepTest(SweepTest):
+    numpy = numpy
+
+    def test_column_is_array(self):
+        assert isinstance(self.sweep.column('status_code', lambda response: response.status_code), numpy.ndarray)
+
+
 class HttpStatusTest(unittest.TestCase):
     def setUp(self):
         self.expectation = HttpStatus({'type': 'HTTP_STATUS', 'status_range': "200-300"})
@@ -88,6 +181,14 @@ class HttpStatusTest(unittest.TestCase):
         assert self.expectation.get_message(request) == ('Unexpected HTTP '
                                                          'status (400)')
 
+    def test_get_statuses(self):
+        healthy = mock.Mock()
+        healthy.status_code = 200
+        unhealthy = mock.Mock()
+        unhealthy.status_code = 400
+
+        assert list(self.expectation.get_statuses(Sweep([healthy, unhealthy, healthy]))) == [1, 3, 1]
+
 
 class RegexTest(unittest.TestCase):
     def setUp(self):
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+import unittest
+
+import cachet_url_monitor.status as st
+from cachet_url_monitor.history import FleetHistory
+from cachet_url_monitor.history import RollingSums
+from cachet_url_monitor.history import StatusHistory
+
+
+class RollingSumsTest(unittest.TestCase):
+    def test_append(self):
+        sums = RollingSums(10, [10, 100], 'B')
+
+        for timestamp in range(0, 50, 5):
+            sums.append(timestamp, (1,))
+
+        # The 10 seconds window only holds the rows at 40 and 45.
+        assert sums.totals.sums == [[2], [10]]
+
+    def test_append_past_capacity(self):
+        sums = RollingSums(3, [100], 'B')
+
+        for value in range(5):
+            sums.append(value, (value,))
+
+        assert sums.totals.sums == [[2 + 3 + 4]]
+
+    def test_clear(self):
+        fleet = FleetHistory([10])
+        sums = RollingSums(3, [10], 'Bf', parent=fleet.repair_totals)
+        sums.append(0, (1, 2.5))
+
+        sums.clear()
+
+        assert sums.totals.sums == [[0, 0]]
+        assert fleet.repair_totals.sums == [[0, 0]]
+
+    def test_clear_without_drift(self):
+        fleet = FleetHistory([10])
+        sums = RollingSums(3, [10], 'Bf', parent=fleet.repair_totals)
+        # 0.1 can't be stored exactly in the array, what it holds must be what's added to the sums.
+        sums.append(0, (1, 0.1))
+
+        sums.clear()
+
+        assert sums.totals.sums == [[0, 0]]
+        assert fleet.repair_totals.sums == [[0, 0]]
+
+    def test_append_past_capacity_without_drift(self):
+        sums = RollingSums(3, [100], 'Bf')
+
+        for timestamp in range(1000):
+            sums.append(timestamp, (1, 0.1 * (timestamp % 7)))
+        sums.clear()
+
+        assert sums.totals.sums[0][0] == 0
+        assert abs(sums.totals.sums[0][1]) < 1e-12
+
+
+class StatusHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.fleet = FleetHistory([60, 3600])
+        self.history = StatusHistory(120, self.fleet)
+
+    def test_init(self):
+        assert self.history.uptime(60) is None
+        assert self.history.mttr(60) is None
+
+    def test_add(self):
+        self.history.add(0, st.COMPONENT_STATUS_OPERATIONAL, 0.2)
+        self.history.add(30, st.COMPONENT_STATUS_PERFORMANCE_ISSUES, 2)
+        self.history.add(60, st.COMPONENT_STATUS_PARTIAL_OUTAGE)
+        self.history.add(90, st.COMPONENT_STATUS_OPERATIONAL, 0.2)
+
+        assert self.history.uptime(3600) == 0.5
+        assert self.history.availability(3600) == 0.75
+        assert abs(self.history.latency(3600) - 0.8) < 0.0001
+        assert self.history.mttr(3600) == 60
+        # The last minute only holds the checks at 60 and 90.
+        assert self.history.uptime(60) == 0.5
+        assert self.history.availability(60) == 0.5
+
+    def test_mttr_expires(self):
+        self.history.add(0, st.COMPONENT_STATUS_PARTIAL_OUTAGE)
+        self.history.add(30, st.COMPONENT_STATUS_OPERATIONAL, 0.2)
+        self.history.add(120, st.COMPONENT_STATUS_OPERATIONAL, 0.2)
+
+        assert self.history.mttr(60) is None
+        assert self.history.mttr(3600) == 30
+
+    def test_mttr_expires_when_outage_starts(self):
+        self.history.add(0, st.COMPONENT_STATUS_PARTIAL_OUTAGE)
+        self.history.add(10, st.COMPONENT_STATUS_OPERATIONAL, 0.2)
+        self.history.add(100, st.COMPONENT_STATUS_PARTIAL_OUTAGE)
+
+        assert self.history.mttr(60) is None
+        assert self.history.mttr(3600) == 10
+
+    def test_fleet(self):
+        other = StatusHistory(120, self.fleet)
+        self.history.add(0, st.COMPONENT_STATUS_OPERATIONAL, 0.2)
+        other.add(0, st.COMPONENT_STATUS_MAJOR_OUTAGE)
+
+        assert self.fleet.uptime(60) == 0.5
+
+        other.remove()
+
+        assert self.fleet.uptime(60) == 1
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+import unittest
+
+import pytest
+
+from cachet_url_monitor.incident import IncidentCorrelator
+
+
+class IncidentCorrelatorTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000
+        self.correlator = IncidentCorrelator('center', 60, clock=lambda: self.now)
+
+    def test_init_with_invalid_grouping(self):
+        with pytest.raises(ValueError):
+            IncidentCorrelator('rack')
+
+    def test_correlation_key(self):
+        assert self.correlator.correlation_key('svc-qdc-prd1', 'http://host1/health') == 'qdc'
+        assert IncidentCorrelator('service').correlation_key('svc-qdc-prd1', 'http://host1/health') == 'svc'
+        assert IncidentCorrelator('host').correlation_key('svc-qdc-prd1', 'http://host1:8080/health') == 'host1'
+        assert IncidentCorrelator().correlation_key('svc-qdc-prd1', 'http://host1/health') is None
+
+    def test_correlation_key_without_convention(self):
+        assert self.correlator.correlation_key('svc', 'http://host1/health') is None
+        assert IncidentCorrelator('service').correlation_key('my-svc-qdc-prd1', 'http://host1/health') is None
+
+    def test_cluster(self):
+        clusters = self.correlator.cluster([(0, 'qdc'), (1, 'lvdc'), (2, 'qdc'), (3, None)])
+
+        assert clusters == [('qdc', None, [0, 2]), ('lvdc', None, [1]), (None, None, [3])]
+
+    def test_cluster_joins_open_incident(self):
+        self.correlator.register('qdc', 7, [10, 11])
+        self.now += 30
+
+        assert self.correlator.cluster([(2, 'qdc')]) == [('qdc', 7, [2])]
+
+    def test_cluster_after_window(self):
+        self.correlator.register('qdc', 7, [10, 11])
+        self.now += 61
+
+        assert self.correlator.cluster([(2, 'qdc')]) == [('qdc', None, [2])]
+
+    def test_resolve(self):
+        self.correlator.register('qdc', 7, [10, 11])
+
+        assert not self.correlator.resolve(7, 10)
+        assert self.correlator.resolve(7, 11)
+        assert self.correlator.cluster([(2, 'qdc')]) == [('qdc', None, [2])]
+
+    def test_resolve_ungrouped_incident(self):
+        assert self.correlator.resolve(3, 10)
+
+    def test_restore(self):
+        self.correlator.restore({10: 7, 11: 7, 12: 8})
+
+        assert not self.correlator.resolve(7, 10)
+        assert self.correlator.resolve(7, 11)
+        assert self.correlator.resolve(8, 12)
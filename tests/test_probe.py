@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+import threading
+import unittest
+from BaseHTTPServer import BaseHTTPRequestHandler
+from BaseHTTPServer import HTTPServer
+
+from cachet_url_monitor.probe import PhaseTimings
+from cachet_url_monitor.probe import Prober
+
+
+class HealthHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    requests = 0
+
+    def do_GET(self):
+        HealthHandler.requests += 1
+        body = '<body>healthy</body>'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class PhaseTimingsTest(unittest.TestCase):
+    def test_init(self):
+        timings = PhaseTimings()
+
+        assert timings.dns == timings.connect == timings.tls == timings.ttfb == timings.total == 0.0
+
+
+class ProberTest(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), HealthHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/health' % (self.server.server_address[1],)
+        self.prober = Prober()
+
+    def tearDown(self):
+        self.prober.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_request(self):
+        response = self.prober.request('GET', self.url, timeout=1)
+
+        assert response.status_code == 200
+        assert response.text == '<body>healthy</body>'
+        assert response.timings.connect > 0
+        assert response.timings.tls == 0
+        assert 0 < response.timings.ttfb <= response.timings.total
+
+    def test_request_with_reused_connection(self):
+        self.prober.request('GET', self.url, timeout=1)
+        response = self.prober.request('GET', self.url, timeout=1)
+
+        assert response.timings.dns == 0
+        assert response.timings.connect == 0
+        assert response.timings.total > 0
+
+    def test_request_coalesced(self):
+        prober = Prober(coalesce_window=60)
+        HealthHandler.requests = 0
+
+        first = prober.request('GET', self.url, timeout=1)
+        second = prober.request('GET', self.url, timeout=1)
+
+        assert first is second
+        assert HealthHandler.requests == 1
+        prober.session.close()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import unittest
+
+from cachet_url_monitor.profiling import Profiler
+from cachet_url_monitor.profiling import install_signal_handler
+from cachet_url_monitor.profiling import profiled
+
+
+class Job(object):
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.runs = 0
+
+    @profiled('execute')
+    def execute(self):
+        self.runs += 1
+        return self.runs
+
+
+class ProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.profiler = Profiler('config', self.directory, runs=2)
+        self.job = Job(self.profiler)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_init(self):
+        assert self.profiler.remaining == {}
+
+    def test_arm_while_running(self):
+        # The signal handler runs arm() on the main thread, which may be in the middle of run().
+        def arm():
+            with self.profiler.lock:
+                self.profiler.arm()
+
+        thread = threading.Thread(target=arm)
+        thread.daemon = True
+        thread.start()
+        thread.join(5)
+
+        assert not thread.is_alive()
+        assert self.profiler.remaining == {'execute': 2, 'update_urls': 2}
+
+    def test_run_not_armed(self):
+        assert self.job.execute() == 1
+        assert os.listdir(self.directory) == []
+
+    def test_run_armed(self):
+        self.profiler.arm()
+
+        for i in range(3):
+            self.job.execute()
+
+        reports = sorted(os.listdir(self.directory))
+        assert self.job.runs == 3
+        assert len(reports) == 4
+        assert all(report.startswith('config-execute-') for report in reports)
+        assert len([report for report in reports if report.endswith('.prof')]) == 2
+        assert self.profiler.remaining == {'execute': 0, 'update_urls': 2}
+
+    def test_run_without_profiler(self):
+        job = Job(None)
+
+        assert job.execute() == 1
+
+    def test_signal_handler(self):
+        previous = signal.getsignal(signal.SIGUSR1)
+        try:
+            install_signal_handler([self.profiler])
+            os.kill(os.getpid(), signal.SIGUSR1)
+        finally:
+            signal.signal(signal.SIGUSR1, previous)
+
+        assert self.profiler.remaining['execute'] == 2
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+import threading
+import time
+import unittest
+
+from cachet_url_monitor.rate_limiter import DEFAULT_RETRY_AFTER
+from cachet_url_monitor.rate_limiter import PRIORITY_HIGH
+from cachet_url_monitor.rate_limiter import PRIORITY_LOW
+from cachet_url_monitor.rate_limiter import RateLimiter
+from cachet_url_monitor.rate_limiter import RateLimiters
+from cachet_url_monitor.rate_limiter import parse_retry_after
+
+
+class ParseRetryAfterTest(unittest.TestCase):
+    def test_seconds(self):
+        assert parse_retry_after('120') == 120
+
+    def test_date(self):
+        assert parse_retry_after('Wed, 21 Oct 2015 07:28:30 GMT', clock=lambda: 1445412480) == 30
+
+    def test_missing(self):
+        assert parse_retry_after(None) == DEFAULT_RETRY_AFTER
+        assert parse_retry_after('soon') == DEFAULT_RETRY_AFTER
+
+
+class RateLimiterTest(unittest.TestCase):
+    def acquire_later(self, limiter, priority, results):
+        def acquire():
+            results.append((priority, limiter.acquire(priority, timeout=1)))
+
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        # Gives the thread time to join the queue.
+        time.sleep(0.02)
+        return thread
+
+    def test_acquire_unlimited(self):
+        limiter = RateLimiter()
+
+        assert all(limiter.acquire() for i in range(100))
+
+    def test_acquire_burst(self):
+        limiter = RateLimiter(rate=0.001, burst=2)
+
+        assert limiter.acquire()
+        assert limiter.acquire()
+        assert not limiter.acquire(timeout=0.01)
+
+    def test_acquire_waits_for_token(self):
+        limiter = RateLimiter(rate=20, burst=1)
+        limiter.acquire()
+
+        start = time.time()
+        assert limiter.acquire(timeout=1)
+        assert time.time() - start >= 0.04
+
+    def test_pause(self):
+        limiter = RateLimiter()
+        limiter.pause(0.05)
+
+        start = time.time()
+        assert limiter.acquire(timeout=1)
+        assert time.time() - start >= 0.05
+
+    def test_acquire_paused_past_timeout(self):
+        limiter = RateLimiter()
+        limiter.pause(60)
+
+        start = time.time()
+        assert not limiter.acquire(PRIORITY_LOW, timeout=1)
+        # There's no point in waiting for the timeout, the call is rejected right away.
+        assert time.time() - start < 0.5
+
+    def test_acquire_by_priority(self):
+        limiter = RateLimiter()
+        limiter.pause(0.1)
+        results = []
+
+        low = self.acquire_later(limiter, PRIORITY_LOW, results)
+        high = self.acquire_later(limiter, PRIORITY_HIGH, results)
+        low.join()
+        high.join()
+
+        assert results == [(PRIORITY_HIGH, True), (PRIORITY_LOW, True)]
+
+    def test_acquire_with_full_queue(self):
+        limiter = RateLimiter(queue_size=1)
+        limiter.pause(0.1)
+        results = []
+
+        low = self.acquire_later(limiter, PRIORITY_LOW, results)
+        # The queue is full and this call doesn't outrank the one waiting.
+        assert not limiter.acquire(PRIORITY_LOW, timeout=1)
+        high = self.acquire_later(limiter, PRIORITY_HIGH, results)
+        low.join()
+        high.join()
+
+        assert results == [(PRIORITY_LOW, False), (PRIORITY_HIGH, True)]
+
+
+class RateLimitersTest(unittest.TestCase):
+    def test_get(self):
+        limiters = RateLimiters()
+
+        limiter = limiters.get('http://cachet1/api/v1', 2, 4, 10)
+
+        assert (limiter.rate, limiter.burst, limiter.queue_size) == (2, 4, 10)
+        # The settings of the limiter in use are kept.
+        assert limiters.get('http://cachet1/api/v1', 5) is limiter
+        assert limiter.rate == 2
+        assert limiters.get('http://cachet2/api/v1') is not limiter
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+import os
+import shutil
+import tempfile
+import unittest
+
+from cachet_url_monitor.recorder import Recorder
+from cachet_url_monitor.recorder import read_recording
+
+
+class RecorderTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'recording.jsonl')
+        self.recorder = Recorder(self.path)
+
+    def tearDown(self):
+        self.recorder.close()
+        shutil.rmtree(self.directory)
+
+    def test_init(self):
+        assert not os.path.exists(self.path)
+
+    def test_record(self):
+        components = {'component_ids': [1], 'component_names': ['svc'], 'endpoint_urls': ['http://localhost'],
+                      'endpoint_version_urls': ['']}
+        self.recorder.record_components(components, [1])
+        self.recorder.record_sweep(10.12345, [3], ['Request timed out'], [None])
+
+        entries = list(read_recording(self.path))
+
+        assert entries == [
+            {'components': components, 'statuses': [1]},
+            {'timestamp': 10.123, 'statuses': [3], 'messages': ['Request timed out'], 'latencies': [None]},
+        ]
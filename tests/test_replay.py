@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+import os
+import shutil
+import tempfile
+import unittest
+
+from cachet_url_monitor.recorder import Recorder
+
+CONFIGURATION = """
+endpoint:
+  method: GET
+  timeout: 1
+  allowed_fails: 1
+  expectation:
+    - type: HTTP_STATUS
+      status_range: 200-300
+cachet:
+  api_url: http://localhost/api/v1
+  token: my_token
+  public_incidents: true
+  action:
+    - CREATE_INCIDENT
+    - UPDATE_STATUS
+frequency: 30
+update_urls_frequency: 3600
+"""
+
+
+def get_replay_module():
+    # The replay imports the scheduler, which must be imported first by its own tests, as they mock the schedule
+    # module. So we only import it once the tests are running.
+    from cachet_url_monitor import replay
+    return replay
+
+
+class StandInCachetTest(unittest.TestCase):
+    def test_call(self):
+        cachet = get_replay_module().StandInCachet()
+
+        first = cachet.call('post', '/incidents', {'name': 'URL unavailable'})
+        second = cachet.call('post', '/incidents', {'name': 'URL unavailable'})
+        cachet.call('put', '/incidents/1', {'status': 4})
+
+        assert first.json()['data']['id'] == 1
+        assert second.json()['data']['id'] == 2
+        assert cachet.calls == {'POST /incidents': 2, 'PUT /incidents/:id': 1}
+
+
+class ReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.directory, 'config.yml')
+        with open(self.config_file, 'w') as config_file:
+            config_file.write(CONFIGURATION)
+        self.recording = os.path.join(self.directory, 'recording.jsonl')
+
+        recorder = Recorder(self.recording)
+        recorder.record_components({'component_ids': [1], 'component_names': ['svc'],
+                                    'endpoint_urls': ['http://localhost'], 'endpoint_version_urls': ['']}, [1])
+        # A single failure is allowed, so only the second one in a row opens an incident.
+        for timestamp, status in enumerate([1, 3, 1, 3, 3, 1]):
+            recorder.record_sweep(timestamp * 30, [status], ['' if status == 1 else 'Request timed out'],
+                                  [0.1 if status == 1 else None])
+        recorder.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_run(self):
+        report = get_replay_module().Replay(self.config_file, self.recording).run()
+
+        assert report.sweeps == 6
+        assert report.recorded_seconds == 150
+        assert report.calls['POST /incidents'] == 1
+        assert report.calls['PUT /incidents/:id'] == 1
+        assert report.calls['PUT /components/:id'] == 4
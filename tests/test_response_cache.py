@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+import unittest
+
+import mock
+
+from cachet_url_monitor.response_cache import ResponseCache
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = ResponseCache()
+        self.response = mock.Mock()
+        self.response.status_code = 200
+        self.response.content = '<body>healthy</body>'
+        self.response.headers = {'ETag': '"v1"', 'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'}
+
+    def test_lookup_unknown_url(self):
+        response, digest, verdicts = self.cache.lookup('http://localhost/health', self.response)
+
+        assert response is self.response
+        assert verdicts is None
+
+    def test_lookup_same_body(self):
+        response, digest, verdicts = self.cache.lookup('http://localhost/health', self.response)
+        self.cache.store('http://localhost/health', response, digest, {'regex': (1, None)})
+
+        response, digest, verdicts = self.cache.lookup('http://localhost/health', self.response)
+
+        assert verdicts == {'regex': (1, None)}
+
+    def test_lookup_changed_body(self):
+        response, digest, verdicts = self.cache.lookup('http://localhost/health', self.response)
+        self.cache.store('http://localhost/health', response, digest, {'regex': (1, None)})
+        self.response.content = '<body>unhealthy</body>'
+
+        response, digest, verdicts = self.cache.lookup('http://localhost/health', self.response)
+
+        assert verdicts is None
+
+    def test_lookup_not_modified(self):
+        response, digest, verdicts = self.cache.lookup('http://localhost/health', self.response)
+        self.cache.store('http://localhost/health', response, digest, {'regex': (1, None)})
+        not_modified = mock.Mock()
+        not_modified.status_code = 304
+
+        response, digest, verdicts = self.cache.lookup('http://localhost/health', not_modified)
+
+        assert response.status_code == 200
+        assert verdicts == {'regex': (1, None)}
+
+    def test_conditional_headers(self):
+        assert self.cache.conditional_headers('http://localhost/health') == {}
+
+        response, digest, verdicts = self.cache.lookup('http://localhost/health', self.response)
+        self.cache.store('http://localhost/health', response, digest, {})
+
+        assert self.cache.conditional_headers('http://localhost/health') == {
+            'If-None-Match': '"v1"', 'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'}
+
+    def test_conditional_headers_without_cached_verdicts(self):
+        response, digest, verdicts = self.cache.lookup('http://localhost/health', self.response)
+        self.cache.store('http://localhost/health', response, digest, {'regex': (1, None)})
+
+        assert self.cache.conditional_headers('http://localhost/health', ['regex']) == {
+            'If-None-Match': '"v1"', 'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'}
+        # The body is needed by the expectation that was never evaluated.
+        assert self.cache.conditional_headers('http://localhost/health', ['regex', 'other regex']) == {}
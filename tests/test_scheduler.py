@@ -1,5 +1,9 @@
 #!/usr/bin/env python
+import os
+import shutil
 import sys
+import tempfile
+import threading
 import unittest
 
 import mock
@@ -24,6 +28,32 @@ class AgentTest(unittest.TestCase):
         evaluate.assert_called_once()
         push_status.assert_not_called()
 
+    def test_update_urls_with_failure(self):
+        self.configuration.update_urls.side_effect = ValueError('Cachet is unavailable')
+
+        # The failure doesn't reach the schedule, which would stop running the jobs.
+        self.agent.update_urls()
+
+        self.configuration.update_urls.assert_called_once_with()
+
+    def test_start_update_urls(self):
+        started = threading.Event()
+        released = threading.Event()
+
+        def update_urls():
+            started.set()
+            released.wait(5)
+
+        self.configuration.update_urls.side_effect = update_urls
+        self.agent.start_update_urls()
+        started.wait(5)
+        # The previous discovery is still running.
+        self.agent.start_update_urls()
+        released.set()
+        self.agent.update_urls_thread.join(5)
+
+        self.configuration.update_urls.assert_called_once_with()
+
     def test_start(self):
         every = sys.modules['schedule'].every
         self.configuration.data = {'frequency': 5}
@@ -33,6 +63,18 @@ class AgentTest(unittest.TestCase):
         every.assert_called_with(5)
 
 
+    def test_reschedule(self):
+        self.configuration.data = {'frequency': 5, 'update_urls_frequency': 60}
+        self.agent.start()
+        update_urls_job = self.agent.update_urls_job
+
+        self.agent.reschedule(frequency=10)
+
+        sys.modules['schedule'].every.assert_called_with(10)
+        sys.modules['schedule'].cancel_job.assert_called_once()
+        assert self.agent.update_urls_job == update_urls_job
+
+
 class SchedulerTest(unittest.TestCase):
     @mock.patch('requests.get')
     def setUp(self, mock_requests):
@@ -55,3 +97,65 @@ class SchedulerTest(unittest.TestCase):
         # Leaving it as a placeholder.
         self.scheduler.stop = True
         self.scheduler.start()
+
+
+class SchedulerReloadTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.directory, 'config.yml')
+        with open(self.config_file, 'w') as config_file:
+            config_file.write('frequency: 30\n')
+
+        with mock.patch('cachet_url_monitor.scheduler.Configuration') as configuration_class:
+            self.configuration = configuration_class.return_value
+            self.configuration.data = {'frequency': 30, 'update_urls_frequency': 3600, 'cachet': {}}
+            self.configuration.get_action.return_value = []
+            self.configuration.profiling = False
+            self.configuration.profile_directory = None
+            self.configuration.profile_runs = 1
+            self.scheduler = Scheduler(self.config_file)
+        self.scheduler.agent = mock.Mock()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def touch(self):
+        # The modification time doesn't always change when the file is written twice in a row.
+        mtime = os.path.getmtime(self.config_file) + 10
+        os.utime(self.config_file, (mtime, mtime))
+
+    def test_reload_unchanged_file(self):
+        self.scheduler.reload()
+
+        self.configuration.reload.assert_not_called()
+        self.scheduler.agent.reschedule.assert_not_called()
+
+    def test_reload(self):
+        def reload():
+            self.configuration.data = {'frequency': 10, 'update_urls_frequency': 3600, 'cachet': {}}
+
+        self.configuration.reload.side_effect = reload
+        self.touch()
+
+        self.scheduler.reload()
+        self.scheduler.reload()
+
+        self.configuration.reload.assert_called_once_with()
+        self.scheduler.agent.reschedule.assert_called_once_with(10, None)
+
+    def test_reload_with_invalid_configuration(self):
+        self.configuration.reload.side_effect = ValueError('Invalid incident grouping: rack')
+        self.touch()
+
+        self.scheduler.reload()
+
+        self.configuration.reload.assert_called_once_with()
+        self.scheduler.agent.reschedule.assert_not_called()
+        assert self.scheduler.config_mtime == os.path.getmtime(self.config_file)
+
+    def test_reload_without_file(self):
+        os.remove(self.config_file)
+
+        self.scheduler.reload()
+
+        self.configuration.reload.assert_not_called()
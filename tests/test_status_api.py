@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+import json
+import unittest
+import urllib2
+
+import mock
+
+from cachet_url_monitor.status_api import StatusServer
+from cachet_url_monitor.status_api import StatusSnapshot
+
+
+def get_snapshot():
+    return StatusSnapshot([
+        StatusSnapshot.component(1, 'svc1-qdc-prd1', 1, '1.0', '', 100),
+        StatusSnapshot.component(2, 'svc1-lvdc-prd1', 3, '1.0', 'Request timed out', 100),
+        StatusSnapshot.component(3, 'svc2-qdc-e2e', 3, 'Unknown', 'Unexpected HTTP status (500)', -1),
+    ])
+
+
+class StatusSnapshotTest(unittest.TestCase):
+    def test_component(self):
+        component = StatusSnapshot.component(1, 'svc1-qdc-prd1', 1, '1.0', '', -1)
+
+        assert component['service'] == 'svc1'
+        assert component['center'] == 'qdc'
+        assert component['env'] == 'prd1'
+        assert component['checked_at'] is None
+
+    def test_component_with_other_name(self):
+        component = StatusSnapshot.component(1, 'website', 1, '', '', 100)
+
+        assert component['service'] == 'website'
+        assert component['center'] is None
+
+    def test_select(self):
+        snapshot = get_snapshot()
+
+        assert len(snapshot.select()) == 3
+        assert [component['id'] for component in snapshot.select(centers=['qdc'])] == [1, 3]
+        assert [component['id'] for component in snapshot.select(centers=['qdc'], statuses=[3])] == [3]
+        assert [component['id'] for component in snapshot.select(envs=['prd1', 'e2e'], statuses=[1, 3])] == [1, 2, 3]
+
+
+class StatusServerTest(unittest.TestCase):
+    def setUp(self):
+        configuration = mock.Mock()
+        configuration.snapshot = get_snapshot()
+        configuration.get_stats.return_value = {'components': 3}
+        self.server = StatusServer(('127.0.0.1', 0), [configuration])
+        self.server.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get(self, path):
+        response = urllib2.urlopen('http://127.0.0.1:%d%s' % (self.server.server_address[1], path))
+        return json.loads(response.read())
+
+    def test_components(self):
+        response = self.get('/components?per_page=2')
+
+        assert [component['id'] for component in response['data']] == [1, 2]
+        assert response['meta']['pagination']['total'] == 3
+        assert response['meta']['pagination']['total_pages'] == 2
+        assert response['meta']['pagination']['links']['next_page'] == '/components?page=2&per_page=2'
+
+    def test_components_filtered(self):
+        response = self.get('/components?center=qdc&status=3')
+
+        assert [component['id'] for component in response['data']] == [3]
+        assert response['meta']['pagination']['links']['next_page'] is None
+
+    def test_components_with_invalid_page(self):
+        with self.assertRaises(urllib2.HTTPError) as context:
+            self.get('/components?page=0')
+
+        assert context.exception.code == 400
+
+    def test_stats(self):
+        assert self.get('/stats') == {'data': [{'components': 3}]}